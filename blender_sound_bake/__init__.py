@@ -0,0 +1,383 @@
+import math
+
+import numpy as np
+
+import bpy
+from bpy.types import Operator
+from bpy.props import FloatProperty, IntProperty, EnumProperty, BoolProperty
+from bpy_extras.io_utils import ImportHelper
+
+from . import analysis
+from .cache import AnalysisCache
+
+bl_info = {
+    "name": "Bake Sound Spectrum",
+    "author": "Matt Reid",
+    "version": (0, 0, 1),
+    "blender": (2, 73, 0),
+    "location": "File > Import > Bake Sound Spectrum",
+    "description": "Audio visualization with some cubes", 
+    "warning": "",
+    "category": "Animation",
+}
+
+def find_sound_clip():
+    vse = bpy.context.scene.sequence_editor
+    for clip in vse.sequences_all:
+        if clip.type == 'SOUND':
+            return clip
+
+def get_scene_fps(scene=None):
+    if scene is None:
+        scene = bpy.context.scene
+    return scene.render.fps / scene.render.fps_base
+
+def get_fcurve(obj, data_path, index=0, create=True):
+    anim_data = obj.animation_data
+    if anim_data is None:
+        if not create:
+            return None
+        anim_data = obj.animation_data_create()
+    action = anim_data.action
+    if action is None:
+        if not create:
+            return None
+        action = anim_data.action = bpy.data.actions.new(name=obj.name)
+    for fc in action.fcurves:
+        if fc.data_path == data_path and fc.array_index == index:
+            return fc
+    if not create:
+        return None
+    return action.fcurves.new(data_path, index=index)
+
+# Values of the keyframe interpolation enum (BEZT_IPO_*)
+INTERPOLATION_TYPES = {'CONSTANT':0, 'LINEAR':1, 'BEZIER':2}
+
+def write_fcurve(obj, data_path, index, values, frame_start=1, interpolation='LINEAR'):
+    # Replaces the F-curve with one key per value in a single pass
+    # (keyframe_points.add + foreach_set) instead of inserting keys one by one
+    fc = get_fcurve(obj, data_path, index, create=False)
+    if fc is not None:
+        fc.id_data.fcurves.remove(fc)
+    fc = get_fcurve(obj, data_path, index)
+    values = np.asarray(values, dtype=np.float32)
+    co = np.empty(values.size * 2, dtype=np.float32)
+    co[0::2] = np.arange(values.size, dtype=np.float32) + frame_start
+    co[1::2] = values
+    fc.keyframe_points.add(values.size)
+    fc.keyframe_points.foreach_set('co', co)
+    # keyframe_points.add() always creates Bezier keys, so the
+    # interpolation is set on all of them at once by its enum value
+    ipo = INTERPOLATION_TYPES[interpolation]
+    fc.keyframe_points.foreach_set('interpolation', [ipo] * values.size)
+    if interpolation == 'BEZIER':
+        fc.keyframe_points.foreach_set('handle_left', co)
+        fc.keyframe_points.foreach_set('handle_right', co)
+    fc.update()
+    return fc
+
+CENTER_FREQUENCY = analysis.CENTER_FREQUENCY
+FREQUENCY_RANGE = analysis.FREQUENCY_RANGE
+
+class FreqBand():
+    def __init__(self, **kwargs):
+        self.index = kwargs.get('index')
+        self.octave_divisor = kwargs.get('octave_divisor', 1.)
+        self.center = kwargs.get('center')
+        if self.center is None:
+            self.center = self.calc_center()
+        self.range = kwargs.get('range')
+        if self.range is None:
+            self.range = self.calc_range()
+    def calc_center(self):
+        return CENTER_FREQUENCY * 2 ** (self.index / float(self.octave_divisor))
+    def calc_range(self):
+        f = self.center
+        lower = f / (2 ** (1. / self.octave_divisor / 2.))
+        upper = f * (2 ** (1. / self.octave_divisor / 2.))
+        if lower < FREQUENCY_RANGE[0]:
+            lower = FREQUENCY_RANGE[0]
+        if upper > FREQUENCY_RANGE[1]:
+            upper = FREQUENCY_RANGE[1]
+        return [lower, upper]
+    def __str__(self):
+        return '%s<%s>%s' % (self.range[0], self.center, self.range[1])
+class Spectrum():
+    def __init__(self, **kwargs):
+        self.octave_divisor = kwargs.get('octave_divisor', 1.)
+        self.layout = kwargs.get('layout', 'OCTAVE')
+        self.num_bands = kwargs.get('num_bands', 24)
+        self.bands = {}
+        self.build_bands()
+    @property
+    def layout_kwargs(self):
+        return dict(octave_divisor=self.octave_divisor, num_bands=self.num_bands)
+    def build_bands(self):
+        layout = analysis.get_band_layout(self.layout, **self.layout_kwargs)
+        for index, center, low, high in layout:
+            band = FreqBand(
+                index=float(index),
+                octave_divisor=self.octave_divisor,
+                center=center,
+                range=[low, high],
+            )
+            self.bands[center] = band
+    def get_filterbank(self, rate, fft_size):
+        # Columns are in the same (sorted) order as keys()
+        return analysis.get_filterbank(rate, fft_size, self.layout, **self.layout_kwargs)
+    def iterkeys(self):
+        for key in sorted(self.bands.keys()):
+            yield key
+    def itervalues(self):
+        for key in self.iterkeys():
+            yield self.bands[key]
+    def iteritems(self):
+        for key in self.iterkeys():
+            yield key, self.bands[key]
+    def keys(self):
+        return [key for key in self.iterkeys()]
+    def values(self):
+        return [val for val in self.itervalues()]
+    def items(self):
+        return [(key, val) for key, val in self.iteritems()]
+    def analyze(self, filename, fps=None, **kwargs):
+        # Envelopes for all bands from a single decode of the file,
+        # as {center: per-frame array}
+        if fps is None:
+            fps = get_scene_fps()
+        cache = kwargs.pop('cache', None)
+        keys = self.keys()
+        ranges = [self.bands[key].range for key in keys]
+        akwargs = dict(kwargs, filterbank=self.get_filterbank)
+        def do_analyze():
+            return analysis.analyze(filename, ranges, fps, **akwargs)
+        if cache is None:
+            envelopes = do_analyze()
+        else:
+            ckwargs = dict(kwargs, layout=self.layout, **self.layout_kwargs)
+            envelopes = cache.load(filename, fps, do_analyze, **ckwargs)
+        return dict(zip(keys, envelopes))
+
+CUBE_VERTS = [
+    [-1., -1., -1.], [-1., -1., 1.], [-1., 1., -1.], [-1., 1., 1.],
+    [1., -1., -1.], [1., -1., 1.], [1., 1., -1.], [1., 1., 1.],
+]
+CUBE_FACES = [
+    [0, 1, 3, 2], [2, 3, 7, 6], [6, 7, 5, 4],
+    [4, 5, 1, 0], [2, 6, 4, 0], [7, 3, 1, 5],
+]
+
+def build_cube_mesh(**kwargs):
+    # Built through bpy.data so no operator (and no scene update) is involved
+    name = kwargs.get('name', 'soundbake.cube')
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(CUBE_VERTS, [], CUBE_FACES)
+    mesh.update()
+    return mesh
+    
+class Cube():
+    # Objects are created with bpy.data.objects.new and are not linked to
+    # the scene; setup_scene links them all and updates the scene once
+    def __init__(self, **kwargs):
+        self.band = kwargs.get('band')
+        self.offset_index = kwargs.get('offset_index', 0)
+        self.parent = kwargs.get('parent')
+        self.mesh = kwargs.get('mesh')
+        self.material = kwargs.get('material')
+        self.name = 'soundbake.cube.%s.%03d' % (self.band.center, self.offset_index)
+        if self.mesh is None:
+            self.mesh = build_cube_mesh()
+            if self.material is None:
+                self.material = bpy.data.materials.new('soundbake.cube')
+            self.mesh.materials.append(self.material)
+        self.obj = bpy.data.objects.new(self.name, self.mesh)
+        y = self.offset_index * 2.
+        if isinstance(self.parent, Cube):
+            x = 0.
+            pobj = self.parent.obj
+        else:
+            x = self.band.index * 2.
+            self.obj.delta_scale = [1., 1., math.log10(self.band.center)]
+            pobj = self.parent
+        self.obj.location = [x, y, 0.]
+        self.obj.parent = pobj
+    def iter_objects(self):
+        yield self.obj
+    def set_slow_parent(self, offset=None):
+        if offset is None:
+            offset = self.offset_index / 2.
+        self.obj.use_slow_parent = True
+        self.obj.use_extra_recalc_object = True
+        self.obj.slow_parent_offset = offset
+    
+    
+class BakedCube(Cube):
+    # offset_mode is 'SLOW_PARENT' (children lag behind this cube through
+    # use_slow_parent) or one of analysis.OFFSET_MODES, where each child gets
+    # its own curve derived from the envelope and is parented to the
+    # same object as this cube
+    def __init__(self, **kwargs):
+        super(BakedCube, self).__init__(**kwargs)
+        self.offset_count = kwargs.get('offset_count', 10)
+        self.offset_mode = kwargs.get('offset_mode', 'SLOW_PARENT')
+        self.offset_amount = kwargs.get('offset_amount', .5)
+        self.children = {}
+        if self.offset_mode == 'SLOW_PARENT':
+            cparent = self
+        else:
+            cparent = self.parent
+        ckwargs = dict(parent=cparent, band=self.band, mesh=self.mesh)
+        for i in range(1, self.offset_count + 1):
+            ckwargs['offset_index'] = i
+            cube = Cube(**ckwargs)
+            self.children[i] = cube
+    def iter_objects(self):
+        yield self.obj
+        for i in sorted(self.children):
+            for obj in self.children[i].iter_objects():
+                yield obj
+    def bake_envelope(self, values, frame_start=1):
+        write_fcurve(self.obj, 'scale', 2, values, frame_start)
+        if self.offset_mode == 'SLOW_PARENT':
+            self.set_children_slow_parent()
+            return
+        keys = sorted(self.children)
+        amounts = [i * self.offset_amount for i in keys]
+        offset_values = analysis.offset_envelopes(values, amounts, self.offset_mode)
+        for i, cvalues in zip(keys, offset_values):
+            write_fcurve(self.children[i].obj, 'scale', 2, cvalues, frame_start)
+    def set_children_slow_parent(self):
+        for i in sorted(self.children):
+            child = self.children[i]
+            child.set_slow_parent(i * self.offset_amount)
+        
+def setup_scene(**kwargs):
+    octave_divisor = kwargs.get('octave_divisor', 1.)
+    band_layout = kwargs.get('band_layout', 'OCTAVE')
+    num_bands = kwargs.get('num_bands', 24)
+    offset_count = kwargs.get('offset_count', 10)
+    offset_mode = kwargs.get('offset_mode', 'SLOW_PARENT')
+    offset_amount = kwargs.get('offset_amount', .5)
+    filepath = kwargs.get('filepath')
+    use_cache = kwargs.get('use_cache', True)
+    scene = bpy.context.scene
+    spectrum = Spectrum(
+        octave_divisor=octave_divisor,
+        layout=band_layout,
+        num_bands=num_bands,
+    )
+    if filepath is None:
+        clip = find_sound_clip()
+        filepath = clip.filepath
+    cache = None
+    if use_cache:
+        cache = AnalysisCache()
+    # Analyzed before any objects are made, so a failure leaves nothing behind
+    envelopes = spectrum.analyze(bpy.path.abspath(filepath), cache=cache)
+    parent = bpy.data.objects.new('soundbake', None)
+    cubes = []
+    ckwargs = dict(
+        parent=parent,
+        offset_count=offset_count,
+        offset_mode=offset_mode,
+        offset_amount=offset_amount,
+    )
+    for key, band in spectrum.iteritems():
+        ckwargs['band'] = band
+        cube = BakedCube(**ckwargs)
+        cubes.append(cube)
+        if ckwargs.get('mesh') is None:
+            ckwargs['mesh'] = cube.mesh
+    for cube in cubes:
+        cube.bake_envelope(envelopes[cube.band.center])
+    scene.objects.link(parent)
+    for cube in cubes:
+        for obj in cube.iter_objects():
+            scene.objects.link(obj)
+    scene.update()
+    #bpy.context.scene.frame_end = clip.frame_final_duration
+    
+class BakeSoundSpectrum(Operator, ImportHelper):
+    """Bake a sound file into an audio visualization"""
+    bl_idname = 'bake_sound.spectrum'
+    bl_label = 'Bake Sound Spectrum'
+    bl_options = {'REGISTER', 'UNDO'}
+    band_layout = EnumProperty(name='Band Layout',
+        description='Frequency band layout for the analysis',
+        items=[
+            ('OCTAVE', 'Octave', 'Fractional octave bands using the Band Divisor'),
+            ('ISO_THIRD_OCTAVE', 'ISO 1/3 Octave', 'ISO 266 third octave bands'),
+            ('MEL', 'Mel', 'Triangular bands evenly spaced on the mel scale'),
+            ('BARK', 'Bark', 'Critical bands of the Bark scale'),
+        ],
+        default='OCTAVE')
+    octave_divisor = FloatProperty(name='Band Divisor', 
+        description='Divisor to use for each band (Use "1" for a full octave, "3" for 3rd octave).\nHigher values will make more cubes', 
+        default=1.)
+    num_bands = IntProperty(name='Mel Bands',
+        description='Number of bands for the mel layout',
+        default=24, min=1)
+    offset_count = IntProperty(name='Offset Count', 
+        description='Number of cubes to add behind each band with an animation offset', 
+        default=10)
+    offset_mode = EnumProperty(name='Offset Mode',
+        description='How the offset cubes trail behind each band',
+        items=[
+            ('SLOW_PARENT', 'Slow Parent', 'Follow the band cube using slow parent'),
+            ('DELAY', 'Delay', 'Bake a copy of the envelope delayed by Offset Amount frames per cube'),
+            ('SMOOTH', 'Smooth', 'Bake a smoothed copy of the envelope (like slow parent with Offset Amount per cube)'),
+        ],
+        default='SLOW_PARENT')
+    offset_amount = FloatProperty(name='Offset Amount',
+        description='Delay in frames or slow parent offset added for each offset cube',
+        default=.5, min=0.)
+    use_cache = BoolProperty(name='Use Analysis Cache',
+        description='Reuse the envelopes from a previous bake of the same audio and settings',
+        default=True)
+    def draw(self, context):
+        layout = self.layout
+        box = layout.box()
+        box.label('Options:')
+        row = box.row()
+        row.prop(self, 'band_layout')
+        row = box.row()
+        if self.band_layout == 'OCTAVE':
+            row.prop(self, 'octave_divisor')
+        elif self.band_layout == 'MEL':
+            row.prop(self, 'num_bands')
+        row = box.row()
+        row.prop(self, 'offset_count')
+        row = box.row()
+        row.prop(self, 'offset_mode')
+        row = box.row()
+        row.prop(self, 'offset_amount')
+        row = box.row()
+        row.prop(self, 'use_cache')
+    def execute(self, context):
+        try:
+            setup_scene(octave_divisor=self.octave_divisor, 
+                        band_layout=self.band_layout,
+                        num_bands=self.num_bands,
+                        offset_count=self.offset_count, 
+                        offset_mode=self.offset_mode,
+                        offset_amount=self.offset_amount,
+                        use_cache=self.use_cache,
+                        filepath=self.filepath)
+        except analysis.UnsupportedAudioError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+    
+def menu_func_import(self, context):
+    self.layout.operator(BakeSoundSpectrum.bl_idname, text='Bake Sound Spectrum')
+    
+def register():
+    bpy.utils.register_class(BakeSoundSpectrum)
+    bpy.types.INFO_MT_file_import.append(menu_func_import)
+    
+def unregister():
+    bpy.utils.unregister_class(BakeSoundSpectrum)
+    bpy.types.INFO_MT_file_import.remove(menu_func_import)
+    
+if __name__ == '__main__':
+    register()
@@ -0,0 +1,331 @@
+# Audio analysis for the sound bake without bpy. The audio is decoded once,
+# transformed with a short-time FFT and every band envelope is derived from
+# that, instead of running bpy.ops.graph.sound_bake once per band.
+# WAV files are streamed in blocks (see wavreader), so memory use is bounded
+# by the block size and the per-frame output, not by the track length.
+import numpy as np
+
+from .wavreader import WavReader, WavError, DEFAULT_BLOCK_FRAMES
+
+DEFAULT_FFT_SIZE = 4096
+DEFAULT_HOP_SIZE = 256
+DEFAULT_ATTACK = .005
+DEFAULT_RELEASE = .2
+
+class UnsupportedAudioError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return self.msg
+
+def open_aud_sound(filename):
+    # Only the aud.Sound API (Blender 2.80+) can hand the samples to numpy;
+    # the 2.7x aud.Factory has no specs or data()
+    import aud
+    if not hasattr(aud, 'Sound'):
+        raise UnsupportedAudioError(
+            'Only WAV files can be analyzed in this version of Blender '
+            '(convert %s to WAV)' % (filename))
+    return aud.Sound(filename)
+
+def open_audio(filename, block_frames=DEFAULT_BLOCK_FRAMES):
+    # Returns (rate, iterator of mono float32 blocks)
+    try:
+        reader = WavReader(filename)
+    except (WavError, IOError):
+        reader = None
+    if reader is not None:
+        return reader.rate, reader.iter_blocks(block_frames)
+    # Anything else is decoded through Blender's audio library
+    sound = open_aud_sound(filename)
+    rate = int(sound.specs[0])
+    samples = np.asarray(sound.data(), dtype=np.float32)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    blocks = (samples[i:i + block_frames] for i in range(0, len(samples), block_frames))
+    return rate, blocks
+
+def get_sample_rate(filename):
+    # Only reads the header (or the stream specs), nothing is decoded
+    try:
+        return WavReader(filename).rate
+    except (WavError, IOError):
+        pass
+    return int(open_aud_sound(filename).specs[0])
+
+CENTER_FREQUENCY = 1000.
+FREQUENCY_RANGE = [20., 20000.]
+
+BAND_LAYOUTS = ['OCTAVE', 'ISO_THIRD_OCTAVE', 'MEL', 'BARK']
+# Zwicker critical band edges, with the top band extended to 20kHz
+BARK_EDGES = [
+    20., 100., 200., 300., 400., 510., 630., 770., 920., 1080., 1270., 1480.,
+    1720., 2000., 2320., 2700., 3150., 3700., 4400., 5300., 6400., 7700.,
+    9500., 12000., 15500., 20000.,
+]
+
+def hz_to_mel(f):
+    return 2595. * np.log10(1. + np.asarray(f) / 700.)
+
+def mel_to_hz(m):
+    return 700. * (10. ** (np.asarray(m) / 2595.) - 1.)
+
+def get_band_layout(layout='OCTAVE', **kwargs):
+    # Returns a list of (index, center, low, high) for each band, in order
+    # of increasing frequency
+    low, high = kwargs.get('frequency_range', FREQUENCY_RANGE)
+    if layout in ['OCTAVE', 'ISO_THIRD_OCTAVE']:
+        if layout == 'OCTAVE':
+            # center = 1000 * 2 ** (i / octave_divisor)
+            divisor = float(kwargs.get('octave_divisor', 1.))
+            base = 2.
+        else:
+            # ISO 266 base 10 third octaves: 1000 * 10 ** (i / 10)
+            divisor = 10.
+            base = 10.
+        first = int(np.ceil(divisor * np.log(low / CENTER_FREQUENCY) / np.log(base) - 1e-9))
+        last = int(np.floor(divisor * np.log(high / CENTER_FREQUENCY) / np.log(base) + 1e-9))
+        indices = np.arange(first, last + 1)
+        centers = CENTER_FREQUENCY * base ** (indices / divisor)
+        half = base ** (.5 / divisor)
+        lows = np.maximum(centers / half, low)
+        highs = np.minimum(centers * half, high)
+    elif layout == 'MEL':
+        num_bands = kwargs.get('num_bands', 24)
+        points = mel_to_hz(np.linspace(hz_to_mel(low), hz_to_mel(high), num_bands + 2))
+        indices = np.arange(num_bands)
+        centers, lows, highs = points[1:-1], points[:-2], points[2:]
+    elif layout == 'BARK':
+        edges = np.array([e for e in BARK_EDGES if low <= e <= high])
+        indices = np.arange(edges.size - 1)
+        lows, highs = edges[:-1], edges[1:]
+        centers = np.sqrt(lows * highs)
+    else:
+        raise ValueError('Unknown band layout: %r' % (layout))
+    return list(zip(indices.tolist(), centers.tolist(), lows.tolist(), highs.tolist()))
+
+def get_band_matrix(rate, fft_size, band_ranges, centers=None, triangular=False):
+    # (num_bins, num_bands) matrix weighting the FFT bins for each band:
+    # 0/1 membership, or triangles peaking at the centers (mel layout)
+    freqs = np.fft.rfftfreq(fft_size, 1. / rate)[:, None]
+    lows = np.array([r[0] for r in band_ranges])[None, :]
+    highs = np.array([r[1] for r in band_ranges])[None, :]
+    if centers is None:
+        centers = np.sqrt(lows * highs)
+    else:
+        centers = np.asarray(centers, dtype=float)[None, :]
+    if triangular:
+        rising = (freqs - lows) / (centers - lows)
+        falling = (highs - freqs) / (highs - centers)
+        m = np.clip(np.minimum(rising, falling), 0., None)
+    else:
+        m = ((freqs >= lows) & (freqs < highs)).astype(np.float64)
+    # Bands narrower than a bin still get the nearest bin
+    empty = ~(m > 0).any(axis=0)
+    if empty.any():
+        nearest = np.abs(freqs - centers[:, empty]).argmin(axis=0)
+        m[nearest, np.nonzero(empty)[0]] = 1.
+    return m
+
+_filterbanks = {}
+MAX_FILTERBANKS = 16
+
+def get_filterbank(rate, fft_size, layout='OCTAVE', **kwargs):
+    # Band weighting matrix for a layout, cached per
+    # (rate, fft_size, layout, octave_divisor / num_bands)
+    key = (
+        rate, fft_size, layout,
+        float(kwargs.get('octave_divisor', 1.)),
+        kwargs.get('num_bands', 24),
+        tuple(kwargs.get('frequency_range', FREQUENCY_RANGE)),
+    )
+    m = _filterbanks.get(key)
+    if m is None:
+        if len(_filterbanks) >= MAX_FILTERBANKS:
+            _filterbanks.clear()
+        bands = get_band_layout(layout, **kwargs)
+        m = get_band_matrix(
+            rate, fft_size,
+            [(b[2], b[3]) for b in bands],
+            centers=[b[1] for b in bands],
+            triangular=layout == 'MEL',
+        )
+        m.flags.writeable = False
+        _filterbanks[key] = m
+    return m
+
+def iter_windows(blocks, fft_size, hop_size):
+    # Yields (num_windows, fft_size) arrays of overlapping windows from a
+    # stream of sample blocks. Window i is centered on sample i * hop_size;
+    # the samples still needed by the next window are carried over.
+    pad = fft_size // 2
+    carry = np.zeros(pad, dtype=np.float32)
+    def take(buf):
+        count = (buf.size - fft_size) // hop_size + 1
+        if count <= 0:
+            return None, buf
+        stride = buf.strides[0]
+        windows = np.lib.stride_tricks.as_strided(
+            buf, shape=(count, fft_size), strides=(hop_size * stride, stride))
+        return windows, buf[count * hop_size:].copy()
+    for block in blocks:
+        windows, carry = take(np.concatenate([carry, block]))
+        if windows is not None:
+            yield windows
+    windows, carry = take(np.concatenate([carry, np.zeros(pad, dtype=np.float32)]))
+    if windows is not None:
+        yield windows
+
+def band_amplitudes(windows, band_matrix, window):
+    # Amplitude of a sinusoid with the same energy as each band
+    spectrum = np.fft.rfft(windows * window, axis=1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    scale = 4. / (window.size * (window ** 2).sum())
+    return np.sqrt(power.dot(band_matrix) * scale)
+
+def get_envelope_coef(rate, time, arthreshold=.1):
+    if time <= 0:
+        return 0.
+    return arthreshold ** (1. / (rate * time))
+
+class EnvelopeFollower(object):
+    # Same follower as the envelope used by sound_bake, applied to every
+    # band (column) at once:
+    #   out = (attack if in > out else release) * (out - in) + in
+    # with coefficients arthreshold ** (1 / (rate * time)). State is kept
+    # between calls so the input can be streamed.
+    def __init__(self, **kwargs):
+        rate = kwargs.get('rate')
+        arthreshold = kwargs.get('arthreshold', .1)
+        self.attack = get_envelope_coef(rate, kwargs.get('attack', .005), arthreshold)
+        self.release = get_envelope_coef(rate, kwargs.get('release', .2), arthreshold)
+        self.threshold = kwargs.get('threshold', 0.)
+        self.out = np.zeros(kwargs.get('num_bands'))
+    def process(self, values):
+        values = np.abs(np.asarray(values, dtype=np.float64))
+        if self.threshold:
+            values = np.where(values < self.threshold, 0., values)
+        result = np.empty(values.shape)
+        out = self.out
+        a, r = self.attack, self.release
+        for i, v in enumerate(values):
+            coef = np.where(v > out, a, r)
+            out = coef * (out - v) + v
+            result[i] = out
+        self.out = out
+        return result
+
+def envelope(values, rate, attack=.005, release=.2, threshold=0., arthreshold=.1):
+    values = np.asarray(values)
+    follower = EnvelopeFollower(
+        rate=rate, attack=attack, release=release,
+        threshold=threshold, arthreshold=arthreshold,
+        num_bands=values.shape[1:],
+    )
+    return follower.process(values)
+
+OFFSET_MODES = ['DELAY', 'SMOOTH']
+
+def offset_envelopes(values, amounts, mode='DELAY', tolerance=1e-6):
+    # Trailing copies of a per-frame envelope for the offset cubes, as a
+    # (len(amounts), num_frames) float32 array.
+    #   DELAY: each copy is shifted back by its amount in frames
+    #   SMOOTH: each copy follows the envelope like a slow parent with
+    #           slow_parent_offset = amount, i.e.
+    #           out += (in - out) / (1 + amount) on every frame
+    values = np.asarray(values, dtype=np.float64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    n = values.size
+    frames = np.arange(n, dtype=np.float64)
+    if mode == 'DELAY':
+        t = frames[None, :] - amounts[:, None]
+        result = np.interp(t.ravel(), frames, values).reshape(t.shape)
+        return result.astype(np.float32)
+    if mode != 'SMOOTH':
+        raise ValueError('Unknown offset mode: %r' % (mode))
+    result = np.empty((amounts.size, n), dtype=np.float32)
+    for i, amount in enumerate(amounts):
+        fac = 1. / (1. + abs(amount))
+        if fac >= 1.:
+            result[i] = values
+            continue
+        # Truncated impulse response of the one-pole filter; the input is
+        # padded with its first value so the output starts settled
+        size = int(np.ceil(np.log(tolerance) / np.log(1. - fac))) + 1
+        kernel = fac * (1. - fac) ** np.arange(size)
+        kernel /= kernel.sum()
+        padded = np.concatenate([np.full(size - 1, values[0]), values])
+        result[i] = np.convolve(padded, kernel, mode='valid')
+    return result
+
+class FrameSampler(object):
+    # Linear interpolation of the hop-rate envelope at the start of each
+    # scene frame (frame 1 is time 0), fed one block of hops at a time
+    def __init__(self, **kwargs):
+        self.hop_rate = float(kwargs.get('hop_rate'))
+        self.fps = float(kwargs.get('fps'))
+        self.num_hops = 0
+        self.num_frames = 0
+        self.last = None
+        self.frames = []
+    def process(self, values):
+        start = self.num_hops
+        self.num_hops += len(values)
+        if self.last is not None:
+            values = np.concatenate([self.last[None, :], values])
+            start -= 1
+        self.last = values[-1]
+        hop_times = (start + np.arange(len(values))) / self.hop_rate
+        # Frames whose time falls within the hops seen so far
+        end_frame = int(np.floor(hop_times[-1] * self.fps)) + 1
+        times = np.arange(self.num_frames, end_frame) / self.fps
+        if not times.size:
+            return
+        frames = np.empty((times.size, values.shape[1]), dtype=np.float32)
+        for i in range(values.shape[1]):
+            frames[:, i] = np.interp(times, hop_times, values[:, i])
+        self.frames.append(frames)
+        self.num_frames = end_frame
+    def finish(self, num_frames=None):
+        if self.frames:
+            result = np.concatenate(self.frames).T
+        else:
+            result = np.zeros((0 if self.last is None else self.last.size, 0), np.float32)
+        if num_frames is None:
+            return result
+        if result.shape[1] < num_frames:
+            # Hold the last value past the end of the audio
+            pad = np.zeros((result.shape[0], num_frames - result.shape[1]), np.float32)
+            if result.shape[1]:
+                pad[:] = result[:, -1:]
+            result = np.concatenate([result, pad], axis=1)
+        result = result[:, :num_frames]
+        return result
+
+def analyze(filename, band_ranges, fps, **kwargs):
+    # Returns a (num_bands, num_frames) float32 array of band envelopes
+    # sampled at the scene frame rate
+    fft_size = kwargs.get('fft_size', DEFAULT_FFT_SIZE)
+    hop_size = kwargs.get('hop_size', DEFAULT_HOP_SIZE)
+    block_frames = kwargs.get('block_frames', DEFAULT_BLOCK_FRAMES)
+    rate, blocks = open_audio(filename, block_frames)
+    filterbank = kwargs.get('filterbank')
+    if filterbank is not None:
+        # callable(rate, fft_size) returning a cached matrix
+        band_matrix = filterbank(rate, fft_size)
+    else:
+        band_matrix = get_band_matrix(rate, fft_size, band_ranges)
+    window = np.hanning(fft_size).astype(np.float32)
+    hop_rate = rate / float(hop_size)
+    follower = EnvelopeFollower(
+        rate=hop_rate,
+        attack=kwargs.get('attack', DEFAULT_ATTACK),
+        release=kwargs.get('release', DEFAULT_RELEASE),
+        threshold=kwargs.get('threshold', 0.),
+        num_bands=band_matrix.shape[1],
+    )
+    sampler = FrameSampler(hop_rate=hop_rate, fps=fps)
+    for windows in iter_windows(blocks, fft_size, hop_size):
+        amps = band_amplitudes(windows, band_matrix, window)
+        sampler.process(follower.process(amps))
+    return sampler.finish(kwargs.get('num_frames'))
@@ -0,0 +1,169 @@
+# On-disk cache of analysis results. Entries are keyed by the audio content
+# (sha1 of the file) and every parameter that changes the envelopes, so a
+# rebake that only changes the geometry (offset count, undo/redo) loads the
+# envelopes instead of analyzing the audio again.
+import os
+import json
+import time
+import hashlib
+
+import numpy as np
+
+from . import analysis
+
+DEFAULT_CACHE_DIR = '~/.cache/blender_sound_bake'
+DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_HASHES = 256
+CACHE_VERSION = 1
+HASH_INDEX = 'hashes.json'
+
+def hash_file(filename, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+class AnalysisCache(object):
+    # Each entry is a single float32 (num_bands, num_frames) .npy file named
+    # by the key. Loading an entry touches it, so the file mtimes give the
+    # LRU order used by evict().
+    def __init__(self, **kwargs):
+        path = kwargs.get('path', DEFAULT_CACHE_DIR)
+        self.path = os.path.expanduser(path)
+        self.max_size = kwargs.get('max_size', DEFAULT_MAX_SIZE)
+        self.max_entries = kwargs.get('max_entries', DEFAULT_MAX_ENTRIES)
+        self.max_hashes = kwargs.get('max_hashes', DEFAULT_MAX_HASHES)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        self._hashes = None
+    def get_file_hash(self, filename):
+        # File hashes are remembered by path and stats, so an unchanged file
+        # is only read once
+        filename = os.path.abspath(filename)
+        if self._hashes is None:
+            self._hashes = self._read_hashes()
+        st = os.stat(filename)
+        entry = self._hashes.get(filename)
+        if entry is not None and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+            # Used times are only written with the next change (or evict)
+            entry['used'] = time.time()
+            return entry['hash']
+        file_hash = hash_file(filename)
+        self._hashes[filename] = {
+            'mtime':st.st_mtime, 'size':st.st_size, 'hash':file_hash,
+            'used':time.time(),
+        }
+        self._write_hashes()
+        return file_hash
+    def _read_hashes(self):
+        try:
+            with open(os.path.join(self.path, HASH_INDEX), 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+    def _write_hashes(self):
+        fn = os.path.join(self.path, HASH_INDEX)
+        tmp_fn = fn + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump(self._hashes, f)
+        os.replace(tmp_fn, fn)
+    def get_key(self, filename, fps, **kwargs):
+        params = {
+            'version':CACHE_VERSION,
+            'hash':self.get_file_hash(filename),
+            'rate':analysis.get_sample_rate(filename),
+            'fps':float(fps),
+            'layout':kwargs.get('layout', 'OCTAVE'),
+            'octave_divisor':float(kwargs.get('octave_divisor', 1.)),
+            'num_bands':kwargs.get('num_bands', 24),
+            'attack':kwargs.get('attack', analysis.DEFAULT_ATTACK),
+            'release':kwargs.get('release', analysis.DEFAULT_RELEASE),
+            'threshold':kwargs.get('threshold', 0.),
+            'fft_size':kwargs.get('fft_size', analysis.DEFAULT_FFT_SIZE),
+            'hop_size':kwargs.get('hop_size', analysis.DEFAULT_HOP_SIZE),
+            'num_frames':kwargs.get('num_frames'),
+        }
+        s = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(s.encode('utf-8')).hexdigest()
+    def get_entry_path(self, key):
+        return os.path.join(self.path, key + '.npy')
+    def get(self, key):
+        fn = self.get_entry_path(key)
+        try:
+            values = np.load(fn)
+        except (IOError, ValueError):
+            return None
+        # Mark as recently used for eviction
+        os.utime(fn, None)
+        return values
+    def store(self, key, values):
+        fn = self.get_entry_path(key)
+        tmp_fn = fn + '.tmp'
+        with open(tmp_fn, 'wb') as f:
+            np.save(f, np.asarray(values, dtype=np.float32))
+        os.replace(tmp_fn, fn)
+        self.evict()
+    def load(self, filename, fps, analyze, **kwargs):
+        # analyze() is only called on a miss; kwargs are the bake parameters
+        # that make up the key
+        key = self.get_key(filename, fps, **kwargs)
+        values = self.get(key)
+        if values is None:
+            values = analyze()
+            self.store(key, values)
+        return values
+    def invalidate(self, key):
+        fn = self.get_entry_path(key)
+        if os.path.exists(fn):
+            os.remove(fn)
+    def clear(self):
+        for fn in os.listdir(self.path):
+            if os.path.splitext(fn)[1] in ['.npy', '.tmp']:
+                os.remove(os.path.join(self.path, fn))
+        self._hashes = {}
+        self._write_hashes()
+    def prune_hashes(self, max_hashes=None):
+        # Drops remembered hashes of files that are gone, then all but the
+        # most recently used max_hashes
+        if max_hashes is None:
+            max_hashes = self.max_hashes
+        if self._hashes is None:
+            self._hashes = self._read_hashes()
+        hashes = {fn: e for fn, e in self._hashes.items() if os.path.exists(fn)}
+        if max_hashes is not None and len(hashes) > max_hashes:
+            keep = sorted(hashes, key=lambda fn: hashes[fn].get('used', 0), reverse=True)
+            hashes = {fn: hashes[fn] for fn in keep[:max_hashes]}
+        self._hashes = hashes
+        self._write_hashes()
+    def iter_entries(self):
+        for fn in os.listdir(self.path):
+            key, ext = os.path.splitext(fn)
+            if ext != '.npy':
+                continue
+            st = os.stat(os.path.join(self.path, fn))
+            yield key, st.st_mtime, st.st_size
+    @property
+    def size(self):
+        return sum(size for key, atime, size in self.iter_entries())
+    def evict(self, max_size=None, max_entries=None):
+        if max_size is None:
+            max_size = self.max_size
+        if max_entries is None:
+            max_entries = self.max_entries
+        self.prune_hashes()
+        entries = sorted(self.iter_entries(), key=lambda e: e[1])
+        total = sum(e[2] for e in entries)
+        count = len(entries)
+        # Least recently used entries go first
+        for key, atime, size in entries:
+            if (max_size is None or total <= max_size) and \
+               (max_entries is None or count <= max_entries):
+                break
+            self.invalidate(key)
+            total -= size
+            count -= 1
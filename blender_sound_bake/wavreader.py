@@ -0,0 +1,125 @@
+# RIFF/WAVE reader that memory-maps the sample data and converts it to
+# float32 in fixed-size blocks, so memory use doesn't depend on the length
+# of the file.
+import os
+import struct
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+DEFAULT_BLOCK_FRAMES = 1 << 18
+
+class WavError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+        return repr(self.msg)
+
+class WavReader(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.format = None
+        self.channels = None
+        self.rate = None
+        self.sample_width = None
+        self.data_offset = None
+        self.data_size = None
+        self.read_header()
+        self.num_frames = self.data_size // (self.sample_width * self.channels)
+        self._data = None
+    def read_header(self):
+        with open(self.filename, 'rb') as f:
+            riff = f.read(12)
+            if riff[:4] == b'RF64':
+                # RF64 (files over 4GB) isn't supported; open_audio falls
+                # back to aud, which decodes the whole file in memory
+                raise WavError('RF64 files are not supported: %s' % (self.filename))
+            if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+                raise WavError('Not a RIFF/WAVE file: %s' % (self.filename))
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    break
+                chunk_id, size = struct.unpack('<4sI', chunk)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(size)
+                    (self.format, self.channels, self.rate, byte_rate,
+                     block_align, bits) = struct.unpack('<HHIIHH', fmt[:16])
+                    if self.format == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                        self.format = struct.unpack('<H', fmt[24:26])[0]
+                    self.sample_width = bits // 8
+                elif chunk_id == b'data':
+                    self.data_offset = f.tell()
+                    # Truncated files, or files still being written, may
+                    # claim more data than there is. 0 and 0xFFFFFFFF are
+                    # used by streaming writers for "up to the end of file".
+                    available = max(0, os.fstat(f.fileno()).st_size - self.data_offset)
+                    if size in [0, 0xFFFFFFFF] or size > available:
+                        size = available
+                    self.data_size = size
+                    break
+                else:
+                    f.seek(size, 1)
+                # Chunks are word aligned
+                if size % 2:
+                    f.seek(1, 1)
+        if self.format is None or self.data_offset is None:
+            raise WavError('Missing fmt or data chunk: %s' % (self.filename))
+        if self.format not in [WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT]:
+            raise WavError('Unsupported WAVE format: %d' % (self.format))
+        if self.format == WAVE_FORMAT_IEEE_FLOAT and self.sample_width not in [4, 8]:
+            raise WavError('Unsupported float width: %d' % (self.sample_width))
+        if self.format == WAVE_FORMAT_PCM and self.sample_width not in [1, 2, 3, 4]:
+            raise WavError('Unsupported PCM width: %d' % (self.sample_width))
+    @property
+    def duration(self):
+        return self.num_frames / float(self.rate)
+    @property
+    def data(self):
+        # Raw samples memory-mapped as (num_frames, channels), or as bytes
+        # (num_frames, channels * 3) for 24 bit files
+        if self._data is None:
+            width = self.sample_width
+            if self.format == WAVE_FORMAT_IEEE_FLOAT:
+                dtype = {4:'<f4', 8:'<f8'}[width]
+            else:
+                dtype = {1:'u1', 2:'<i2', 3:'u1', 4:'<i4'}[width]
+            columns = self.channels * 3 if width == 3 else self.channels
+            if self.num_frames:
+                self._data = np.memmap(
+                    self.filename, dtype=dtype, mode='r',
+                    offset=self.data_offset, shape=(self.num_frames, columns))
+            else:
+                self._data = np.zeros((0, columns), dtype=dtype)
+        return self._data
+    def convert(self, raw):
+        if self.format == WAVE_FORMAT_IEEE_FLOAT:
+            return raw.astype(np.float32)
+        width = self.sample_width
+        if width == 1:
+            return (raw.astype(np.float32) - 128.) / 128.
+        if width == 3:
+            b = raw.reshape(len(raw), self.channels, 3).astype(np.int32)
+            ints = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+            ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+            return ints.astype(np.float32) / float(1 << 23)
+        return raw.astype(np.float32) / float(2 ** (8 * width - 1))
+    def iter_blocks(self, block_frames=DEFAULT_BLOCK_FRAMES, mono=True):
+        # float32 blocks of up to block_frames frames in [-1, 1], shape
+        # (frames,) when mono, otherwise (frames, channels)
+        data = self.data
+        for start in range(0, self.num_frames, block_frames):
+            block = self.convert(data[start:start + block_frames])
+            if mono:
+                block = block.mean(axis=1) if self.channels > 1 else block[:, 0]
+            yield block
+    def read(self, mono=False):
+        blocks = list(self.iter_blocks(mono=mono))
+        if not blocks:
+            return np.zeros((0,) if mono else (0, self.channels), dtype=np.float32)
+        return np.concatenate(blocks)
+    def close(self):
+        self._data = None
@@ -0,0 +1,621 @@
+import os
+try:
+    from collections.abc import Sequence, Mapping
+except ImportError:
+    from collections import Sequence, Mapping
+import json
+import numbers
+
+import numpy as np
+
+from .interpolate import AngleAxis, GridSampler, directions_to_angles
+from . import symmetry
+
+DELIMS = [',', ';', ' ']
+DELIM_TABLE = {ord(delim): ' ' for delim in DELIMS}
+def split_line(line):
+    for delim in DELIMS:
+        line = line.replace(delim,'\t')
+    return line.strip('\t').split('\t')
+
+def tokenize(s):
+    # Split a whole block at once, ignoring how values wrap across lines
+    return s.translate(DELIM_TABLE).split()
+
+COMPACT_JSON_VERSION = 1
+
+def ies_to_compact_dict(o):
+    # Columnar layout: angle vectors plus one flat, row-major
+    # (vertical, horizontal) candela list
+    candela = o.candela_array
+    return {
+        '_IES_COMPACT_':COMPACT_JSON_VERSION,
+        'filename':o.filename,
+        'keywords':{k: v.value for k, v in o.keywords.items()},
+        'fields':{k: v.value for k, v in o.fields.items()},
+        'vertical_angles':o.vertical_angles.tolist(),
+        'horizontal_angles':o.horizontal_angles.tolist(),
+        'candela':candela.ravel().tolist(),
+    }
+
+def ies_from_compact_dict(d):
+    version = d['_IES_COMPACT_']
+    if version != COMPACT_JSON_VERSION:
+        raise ValueError('Unsupported compact IES JSON version: %r' % (version))
+    v_angles = np.array(d['vertical_angles'], dtype=float)
+    h_angles = np.array(d['horizontal_angles'], dtype=float)
+    return IESData(
+        filename=d.get('filename'),
+        keywords=d['keywords'],
+        fields=d['fields'],
+        angles={'vertical':v_angles, 'horizontal':h_angles},
+        candela_array=np.array(d['candela'], dtype=float),
+    )
+
+class IESJSONEncoder(json.JSONEncoder):
+    def __init__(self, **kwargs):
+        self.compact = kwargs.pop('compact', False)
+        super(IESJSONEncoder, self).__init__(**kwargs)
+    def default(self, o):
+        if self.compact and isinstance(o, IESData):
+            return ies_to_compact_dict(o)
+        if isinstance(o, (IESData, IESBase)):
+            d = {'_IES_CLS_':o.__class__.__name__}
+            if isinstance(o, IESData):
+                attrs = ['filename', 'keywords', 'fields', 'candela_values']
+                d.update({k: getattr(o, k) for k in attrs})
+                if o.dense:
+                    d['candela_values'] = [c for v, h, c in o.iter_candela()]
+            else:
+                d.update({'name':o.name, 'value':o.value})
+            if isinstance(o, IESCandelaValue):
+                d.update({k: getattr(o, k) for k in ['vertical', 'horizontal']})
+            return d
+        elif isinstance(o, dict):
+            numkeys = [k for k in o.keys() if isinstance(k, numbers.Number)]
+            for k in numkeys:
+                v = o.pop(k)
+                o[str(k)] = v
+        return super(IESJSONEncoder, self).default(o)
+
+def ies_json_object_hook(d):
+    if '_IES_COMPACT_' in d:
+        return ies_from_compact_dict(d)
+    if '_IES_CLS_' in d.keys():
+        if d['_IES_CLS_'] == 'IESData':
+            cls = IESData
+        else:
+            cls = IESBase.find_subclass(d['_IES_CLS_'])
+        #for key, val in d.items():
+        #    if isinstance(val, dict):
+        #        d[key] = ies_json_object_hook(val)
+        return cls(**d)
+    return d
+
+class IESJSONDecoder(json.JSONDecoder):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('object_hook', ies_json_object_hook)
+        super(IESJSONDecoder, self).__init__(**kwargs)
+
+class IESBase(object):
+    __slots__ = ('parent', 'name')
+    def __init__(self, **kwargs):
+        kwargs = self.parse(**kwargs)
+        self.parent = kwargs.get('parent')
+        self.name = kwargs.get('name')
+        self.value = kwargs.get('value')
+    @classmethod
+    def find_subclass(cls, cls_name):
+        if cls_name == cls.__name__:
+            return cls
+        for _cls in cls.__subclasses__():
+            r = _cls.find_subclass(cls_name)
+            if r is not None:
+                return r
+        return None
+    def parse(self, **kwargs):
+        return kwargs
+    def __repr__(self):
+        return '%s (%s)' % (self.__class__.__name__, self)
+    def __str__(self):
+        return '%s: %s' % (self.name, self.value)
+
+class IESKeyword(IESBase):
+    __slots__ = ('value',)
+    def parse(self, **kwargs):
+        parse_str = kwargs.get('parse_str')
+        if parse_str is None:
+            return kwargs
+        name = parse_str.split('[')[1].split(']')[0]
+        value = parse_str.split(']')[1]
+        return dict(name=name, value=value)
+
+class IESField(IESBase):
+    __slots__ = ('value',)
+    _field_map = [
+        ['num_lamps', 'lumens_per_lamp', 'candela_multiplier',
+         'num_vertical_angles', 'num_horizontal_angles',
+         'photometric_type', 'units_type', 'width', 'length', 'height'],
+        ['ballast_factor', '_future_use', 'input_watts'],
+    ]
+    @classmethod
+    def parse_line(cls, **kwargs):
+        parse_str = kwargs.get('parse_str')
+        parse_index = kwargs.get('index')
+        l = split_line(parse_str)
+        return cls.parse_values(values=l, index=parse_index)
+    @classmethod
+    def parse_values(cls, **kwargs):
+        parse_index = kwargs.get('index')
+        d = {}
+        for i, val in enumerate(kwargs.get('values')):
+            name = cls._field_map[parse_index][i]
+            if '.' in val:
+                val = float(val)
+            else:
+                val = int(val)
+            obj = cls(name=name, value=val)
+            d[obj.name] = obj
+        return d
+
+class IESCandelaValue(IESBase):
+    __slots__ = ('vertical', 'horizontal', '_value')
+    def __init__(self, **kwargs):
+        kwargs = self.parse(**kwargs)
+        self.parent = kwargs.get('parent')
+        self.name = kwargs.get('name')
+        self._value = kwargs.get('value')
+    @property
+    def value(self):
+        return self._value
+    @value.setter
+    def value(self, value):
+        # Let the parent know so its candela array doesn't go stale
+        self._value = value
+        p = self.parent
+        if p is not None:
+            p._candela_value_changed(self)
+    def parse(self, **kwargs):
+        self.vertical = kwargs.get('vertical')
+        self.horizontal = kwargs.get('horizontal')
+        kwargs['name'] = (self.vertical, self.horizontal)
+        return kwargs
+    def get_computed_value(self, candela_multiplier=None, ballast_factor=None):
+        p = self.parent
+        if candela_multiplier is None:
+            candela_multiplier = p.candela_multiplier.value
+        if ballast_factor is None:
+            ballast_factor = p.ballast_factor.value
+        return self.value * candela_multiplier * ballast_factor
+
+class CandelaRow(Mapping):
+    # Horizontal angle -> IESCandelaValue for one vertical angle of a dense
+    # IESData. Objects are built on access from the candela array, and
+    # setting their value writes it back to the array.
+    __slots__ = ('parent', 'vertical', 'index')
+    def __init__(self, parent, vertical, index):
+        self.parent = parent
+        self.vertical = vertical
+        self.index = index
+    def __getitem__(self, key):
+        p = self.parent
+        j = p.candela_values.horizontal_index[key]
+        return IESCandelaValue(
+            parent=p,
+            vertical=self.vertical,
+            horizontal=p.horizontal_angles[j].item(),
+            value=p.candela_array[self.index, j].item(),
+        )
+    def __iter__(self):
+        return iter(self.parent.horizontal_angles.tolist())
+    def __len__(self):
+        return self.parent.horizontal_angles.size
+
+class CandelaValueMap(Mapping):
+    # Stand-in for the nested candela_values dict of a dense IESData.
+    # candela_values[v][h] creates an IESCandelaValue only when indexed.
+    def __init__(self, parent):
+        self.parent = parent
+        self.vertical_index = {
+            v: i for i, v in enumerate(parent.vertical_angles.tolist())}
+        self.horizontal_index = {
+            h: j for j, h in enumerate(parent.horizontal_angles.tolist())}
+    def __getitem__(self, key):
+        i = self.vertical_index[key]
+        return CandelaRow(self.parent, self.parent.vertical_angles[i].item(), i)
+    def __iter__(self):
+        return iter(self.parent.vertical_angles.tolist())
+    def __len__(self):
+        return self.parent.vertical_angles.size
+    def set_value(self, vertical, horizontal, value):
+        p = self.parent
+        i = self.vertical_index[vertical]
+        j = self.horizontal_index[horizontal]
+        values = p.candela_array
+        if not values.flags.writeable:
+            # e.g. memory-mapped from the parse cache
+            values = p._candela_array = values.copy()
+        values[i, j] = value
+
+class IESData(object):
+    def __init__(self, **kwargs):
+        self._keywords = {}
+        self._fields = {}
+        self._candela_array = None
+        self._clear_grid_cache()
+        self.vertical_angles = None
+        self.horizontal_angles = None
+        self.dense = False
+        self.filename = kwargs.get('filename')
+        self.keywords = kwargs.get('keywords', {})
+        self.fields = kwargs.get('fields', {})
+        self.candela_values = {}
+        candela_array = kwargs.get('candela_array')
+        if candela_array is not None:
+            angles = kwargs.get('angles')
+            self.set_candela_array(
+                angles['vertical'], angles['horizontal'], candela_array)
+        candela_vals = kwargs.get('candela_values', {})
+        if isinstance(candela_vals, dict):
+            candela_vals = candela_vals.values()
+        for c in candela_vals:
+            if isinstance(c, dict) and 'name' not in c:
+                for _c in c.values():
+                    self.add_candela_value(_c)
+            else:
+                self.add_candela_value(c)
+    @classmethod
+    def from_file(cls, filename, dense=False, cache=None, header_only=False):
+        if cache is not None and not header_only:
+            data = cache.load(filename)
+            if not dense:
+                data = data.to_object_mode()
+            return data
+        data = do_parse(filename, dense=dense, header_only=header_only)
+        data['filename'] = filename
+        return cls(**data)
+    def to_file(self, filename, **kwargs):
+        from .writer import write_ies
+        write_ies(filename, self, **kwargs)
+    @classmethod
+    def from_files(cls, path, **kwargs):
+        from .batch import parse_library
+        return parse_library(path, **kwargs)
+    @property
+    def keywords(self):
+        return self._keywords
+    @keywords.setter
+    def keywords(self, value):
+        if isinstance(value, dict):
+            for key, val in value.items():
+                if isinstance(val, IESKeyword):
+                    self.add_keyword(val)
+                else:
+                    self.add_keyword(name=key, value=val)
+        elif isinstance(value, IESKeyword):
+            value = [value]
+        if isinstance(value, Sequence):
+            for obj in value:
+                self.add_keyword(obj)
+    @property
+    def fields(self):
+        return self._fields
+    @fields.setter
+    def fields(self, value):
+        if isinstance(value, dict):
+            for key, val in value.items():
+                if isinstance(val, IESField):
+                    self.add_field(val)
+                else:
+                    self.add_field(name=key, value=val)
+        elif isinstance(value, IESField):
+            value = [value]
+        if isinstance(value, Sequence):
+            for obj in value:
+                self.add_field(obj)
+    def _add_ies_obj(self, cls, obj=None, dict_attr=None, **kwargs):
+        if obj is None:
+            obj = cls(**kwargs)
+        elif isinstance(obj, dict):
+            obj = cls(**obj)
+        if dict_attr is not None:
+            d = getattr(self, dict_attr)
+            if obj.name in d:
+                d[obj.name].value = obj.value
+                obj = d[obj.name]
+            else:
+                d[obj.name] = obj
+        obj.parent = self
+        return obj
+    def add_keyword(self, obj=None, **kwargs):
+        return self._add_ies_obj(
+            cls=IESKeyword, obj=obj, dict_attr='keywords', **kwargs)
+    def add_field(self, obj=None, **kwargs):
+        return self._add_ies_obj(
+            cls=IESField, obj=obj, dict_attr='fields', **kwargs)
+    def add_candela_value(self, obj=None, **kwargs):
+        obj = self._add_ies_obj(cls=IESCandelaValue, obj=obj, **kwargs)
+        if self.dense:
+            self.candela_values.set_value(obj.vertical, obj.horizontal, obj.value)
+            return obj
+        if obj.vertical not in self.candela_values:
+            self.candela_values[obj.vertical] = {}
+        self.candela_values[obj.vertical][obj.horizontal] = obj
+        self._candela_array = None
+        self._clear_grid_cache()
+        return obj
+    def _candela_value_changed(self, obj):
+        if self.dense:
+            # Objects materialized from the array write through to it
+            self.candela_values.set_value(obj.vertical, obj.horizontal, obj.value)
+            return
+        d = self.candela_values.get(obj.vertical)
+        if d is not None and d.get(obj.horizontal) is obj:
+            self._candela_array = None
+            self._clear_grid_cache()
+    def set_candela_array(self, vertical_angles, horizontal_angles, values):
+        # Dense mode: values has shape (n_vertical, n_horizontal) and is
+        # the only storage for candela samples (no IESCandelaValue objects)
+        v_angles = np.asarray(vertical_angles, dtype=float)
+        h_angles = np.asarray(horizontal_angles, dtype=float)
+        values = np.asarray(values)
+        if values.dtype.kind != 'f':
+            # float32 input (e.g. from a shared store) is kept as is
+            values = values.astype(float)
+        values = values.reshape(v_angles.size, h_angles.size)
+        # Only reorder (and copy) when needed so memory-mapped arrays
+        # stay as views
+        if np.any(np.diff(v_angles) < 0):
+            v_order = np.argsort(v_angles, kind='mergesort')
+            v_angles = v_angles[v_order]
+            values = values[v_order]
+        if np.any(np.diff(h_angles) < 0):
+            h_order = np.argsort(h_angles, kind='mergesort')
+            h_angles = h_angles[h_order]
+            values = values[:, h_order]
+        self.vertical_angles = v_angles
+        self.horizontal_angles = h_angles
+        self._candela_array = values
+        self._clear_grid_cache()
+        self.dense = True
+        self.candela_values = CandelaValueMap(self)
+    def to_object_mode(self):
+        # Copy holding one IESCandelaValue per sample, as parsed with
+        # dense=False
+        candela_vals = {}
+        for v, h, value in self._iter_array(self.candela_array):
+            obj = IESCandelaValue(vertical=v, horizontal=h, value=value)
+            candela_vals[obj.name] = obj
+        return IESData(
+            filename=self.filename,
+            keywords={k: obj.value for k, obj in self.keywords.items()},
+            fields={k: obj.value for k, obj in self.fields.items()},
+            candela_values=candela_vals,
+        )
+    def build_candela_array(self):
+        cvals = self.candela_values
+        v_angles = sorted(cvals.keys())
+        h_angles = sorted(set(h for d in cvals.values() for h in d.keys()))
+        values = np.zeros((len(v_angles), len(h_angles)))
+        for i, v in enumerate(v_angles):
+            d = cvals[v]
+            for j, h in enumerate(h_angles):
+                cobj = d.get(h)
+                if cobj is not None:
+                    values[i, j] = cobj.value
+        self.vertical_angles = np.array(v_angles, dtype=float)
+        self.horizontal_angles = np.array(h_angles, dtype=float)
+        self._candela_array = values
+        self._clear_grid_cache()
+        return values
+    @property
+    def candela_array(self):
+        values = self._candela_array
+        if values is None:
+            values = self.build_candela_array()
+        return values
+    def get_computed_array(self, candela_multiplier=None, ballast_factor=None):
+        if candela_multiplier is None:
+            candela_multiplier = self.candela_multiplier.value
+        if ballast_factor is None:
+            ballast_factor = self.ballast_factor.value
+        return self.candela_array * (candela_multiplier * ballast_factor)
+    def __getattr__(self, attr):
+        # Look in __dict__ directly so this is safe before __init__ has run
+        # (e.g. while unpickling in a worker process)
+        fields = self.__dict__.get('_fields', {})
+        if attr in fields:
+            return fields[attr]
+        keywords = self.__dict__.get('_keywords')
+        if keywords is not None:
+            _attr = attr
+            if _attr not in keywords:
+                _attr = _attr.upper()
+            if _attr in keywords:
+                return keywords[_attr]
+        raise AttributeError('%r object has no attribute %r' %
+                             (self.__class__, attr))
+    def _clear_grid_cache(self):
+        self._axes = None
+        self._symmetry_map = None
+    @property
+    def symmetry(self):
+        # Make sure the angle vectors exist in object mode
+        self.candela_array
+        return symmetry.detect_symmetry(self.horizontal_angles)
+    @property
+    def symmetry_map(self):
+        # Full 0-360 horizontal angles and the stored column for each one
+        if self._symmetry_map is None:
+            self._symmetry_map = symmetry.expand_horizontal(
+                self.horizontal_angles, self.symmetry)
+        return self._symmetry_map
+    def get_expanded_array(self, computed=False):
+        # Copies the data; prefer symmetry_map where possible
+        if computed:
+            values = self.get_computed_array()
+        else:
+            values = self.candela_array
+        h_angles, index = self.symmetry_map
+        return h_angles, values[:, index]
+    @property
+    def angle_axes(self):
+        if self._axes is None:
+            self.candela_array
+            self._axes = (
+                AngleAxis(self.vertical_angles),
+                AngleAxis(self.horizontal_angles),
+            )
+        return self._axes
+    def get_sampler(self, vertical, horizontal=None, mode='bilinear'):
+        v_axis, h_axis = self.angle_axes
+        h_map = None
+        sym = self.symmetry
+        if horizontal is None:
+            # The 0 degree plane, which still has to be folded into the
+            # stored range (e.g. to 180 for bilateral 90-270 data)
+            horizontal = np.zeros(np.shape(vertical))
+        if sym == symmetry.NONE and h_axis.angles[-1] < 360.:
+            # Interpolate across the seam through the index map
+            h_angles, h_map = self.symmetry_map
+            h_axis = AngleAxis(h_angles)
+            horizontal = np.asarray(horizontal, dtype=float) % 360.
+        else:
+            horizontal = symmetry.fold_horizontal(horizontal, sym)
+        return GridSampler(
+            vertical_axis=v_axis,
+            horizontal_axis=h_axis,
+            horizontal_map=h_map,
+            vertical=vertical,
+            horizontal=horizontal,
+            mode=mode,
+        )
+    def interpolate(self, vertical, horizontal=None, mode='bilinear',
+                    computed=True, sampler=None):
+        if sampler is None:
+            sampler = self.get_sampler(vertical, horizontal, mode)
+        if computed:
+            values = self.get_computed_array()
+        else:
+            values = self.candela_array
+        result = sampler(values)
+        if sampler.mode == 'bicubic':
+            # Cubic overshoot can go below zero next to dark regions
+            np.maximum(result, 0., out=result)
+        return result
+    def to_type_c(self, **kwargs):
+        from .conversion import convert_to_type_c
+        return convert_to_type_c(self, **kwargs)
+    def get_photometry(self, **kwargs):
+        from .photometry import Photometry
+        return Photometry(self, **kwargs)
+    def interpolate_directions(self, directions, mode='bilinear', computed=True):
+        vertical, horizontal = directions_to_angles(directions)
+        return self.interpolate(vertical, horizontal, mode, computed)
+    def iter_candela(self):
+        if self.dense:
+            for v, h, value in self._iter_array(self.candela_array):
+                cobj = IESCandelaValue(
+                    parent=self, vertical=v, horizontal=h, value=value)
+                yield v, h, cobj
+            return
+        cvals = self.candela_values
+        for v in sorted(cvals.keys()):
+            d = cvals[v]
+            for h in sorted(d.keys()):
+                cobj = d[h]
+                yield v, h, cobj
+    def iter_candela_computed(self):
+        for v, h, value in self._iter_array(self.get_computed_array()):
+            yield v, h, value
+    def _iter_array(self, values):
+        h_angles = self.horizontal_angles.tolist()
+        for v, row in zip(self.vertical_angles.tolist(), values.tolist()):
+            for h, value in zip(h_angles, row):
+                yield v, h, value
+
+NUM_FIELD_VALUES = 13
+
+def read_header(f):
+    # Reads lines from f up to (and including) the TILT= line and any
+    # included tilt data, leaving f positioned at the first field line
+    keywords = {}
+    line_num = 0
+    tilt = None
+    while tilt is None:
+        line = f.readline()
+        if not line:
+            raise Exception('Not a valid file')
+        line = line.rstrip('\r\n')
+        if line_num == 0 and line != 'IESNA:LM-63-2002':
+            raise Exception('Not a valid file')
+        if line.startswith('['):
+            keyword = IESKeyword(parse_str=line)
+            keywords[keyword.name] = keyword
+        elif line.startswith('TILT='):
+            tilt = line.split('=')[1]
+        line_num += 1
+    if tilt == 'INCLUDE':
+        for i in range(4):
+            f.readline()
+    return keywords, tilt
+
+def read_field_tokens(f):
+    tokens = []
+    while len(tokens) < NUM_FIELD_VALUES:
+        line = f.readline()
+        if not line:
+            raise Exception('Unexpected end of file')
+        tokens.extend(tokenize(line))
+    return tokens
+
+def parse_fields(tokens):
+    fields = IESField.parse_values(values=tokens[:10], index=0)
+    fields.update(IESField.parse_values(
+        values=tokens[10:NUM_FIELD_VALUES], index=1))
+    return fields
+
+def parse_header(filename):
+    if '~' in filename:
+        filename = os.path.expanduser(filename)
+    with open(filename, 'r') as f:
+        keywords, tilt = read_header(f)
+        tokens = read_field_tokens(f)
+    return dict(keywords=keywords, fields=parse_fields(tokens))
+
+def do_parse(filename, dense=False, header_only=False):
+    if header_only:
+        return parse_header(filename)
+    if '~' in filename:
+        filename = os.path.expanduser(filename)
+    with open(filename, 'r') as f:
+        keywords, tilt = read_header(f)
+        tokens = tokenize(f.read())
+    fields = parse_fields(tokens)
+    num_v = fields['num_vertical_angles'].value
+    num_h = fields['num_horizontal_angles'].value
+    num_values = num_v + num_h + num_v * num_h
+    values = np.array(
+        tokens[NUM_FIELD_VALUES:NUM_FIELD_VALUES + num_values], dtype=float)
+    if values.size < num_values:
+        raise Exception('Unexpected end of file')
+    v_angles = values[:num_v]
+    h_angles = values[num_v:num_v + num_h]
+    # Candela values are stored in the file grouped by horizontal angle
+    candela = values[num_v + num_h:].reshape(num_h, num_v).T
+    data = dict(
+        keywords=keywords,
+        fields=fields,
+        angles={'vertical':v_angles, 'horizontal':h_angles},
+    )
+    if dense:
+        data['candela_array'] = candela
+        return data
+    candela_vals = {}
+    v_list = v_angles.tolist()
+    for j, h_angle in enumerate(h_angles.tolist()):
+        for v_angle, val in zip(v_list, candela[:, j].tolist()):
+            obj = IESCandelaValue(vertical=v_angle, horizontal=h_angle, value=val)
+            candela_vals[obj.name] = obj
+    data['candela_values'] = candela_vals
+    return data
@@ -0,0 +1,93 @@
+import os
+import glob
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from . import IESData
+
+IES_EXTENSIONS = ['.ies']
+
+class BatchResult(object):
+    def __init__(self, **kwargs):
+        self.filename = kwargs.get('filename')
+        self.data = kwargs.get('data')
+        self.error = kwargs.get('error')
+    @property
+    def ok(self):
+        return self.error is None
+    def to_manifest(self):
+        d = {'filename':self.filename, 'ok':self.ok, 'error':self.error}
+        if self.data is not None:
+            d['num_vertical_angles'] = self.data.num_vertical_angles.value
+            d['num_horizontal_angles'] = self.data.num_horizontal_angles.value
+        return d
+    def __repr__(self):
+        return '%s (%s)' % (self.__class__.__name__, self)
+    def __str__(self):
+        if self.ok:
+            return self.filename
+        return '%s: %s' % (self.filename, self.error)
+
+def find_ies_files(path):
+    if '~' in path:
+        path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        filenames = []
+        for root, dirs, files in os.walk(path):
+            for fn in files:
+                if os.path.splitext(fn)[1].lower() in IES_EXTENSIONS:
+                    filenames.append(os.path.join(root, fn))
+    else:
+        filenames = glob.glob(path, recursive=True)
+    return sorted(filenames)
+
+def parse_file(filename, dense=True, header_only=False):
+    try:
+        data = IESData.from_file(filename, dense=dense, header_only=header_only)
+    except Exception as e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+        return BatchResult(filename=filename, error=error)
+    return BatchResult(filename=filename, data=data)
+
+def write_manifest(filename, results):
+    manifest = {
+        'num_files':len(results),
+        'num_errors':len([r for r in results if not r.ok]),
+        'files':[r.to_manifest() for r in results],
+    }
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def map_files(func, filenames, **kwargs):
+    # Runs func(filename, *args) for every file across a process pool.
+    # func must be picklable (a module level function).
+    args = kwargs.get('args', [])
+    max_workers = kwargs.get('max_workers')
+    chunksize = kwargs.get('chunksize')
+    filenames = list(filenames)
+    if chunksize is None:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(filenames) // (workers * 4))
+    iterables = [filenames] + [itertools.repeat(arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map() yields results in the order of filenames
+        return list(executor.map(func, *iterables, chunksize=chunksize))
+
+def parse_files(filenames, **kwargs):
+    dense = kwargs.get('dense', True)
+    header_only = kwargs.get('header_only', False)
+    manifest = kwargs.get('manifest')
+    results = map_files(
+        parse_file, filenames,
+        args=[dense, header_only],
+        max_workers=kwargs.get('max_workers'),
+        chunksize=kwargs.get('chunksize'),
+    )
+    if manifest is not None:
+        write_manifest(manifest, results)
+    return results
+
+def parse_library(path, **kwargs):
+    return parse_files(find_ies_files(path), **kwargs)
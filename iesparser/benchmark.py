@@ -0,0 +1,182 @@
+import os
+import sys
+import gc
+import json
+import shutil
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from . import IESData, IESJSONEncoder, IESJSONDecoder, do_parse
+
+SYMMETRY_RANGES = {
+    'rotational':(0., 0.),
+    'quadrant':(0., 90.),
+    'bilateral':(0., 180.),
+    'none':(0., 360.),
+}
+
+def generate_ies(filename, **kwargs):
+    # Writes a synthetic LM-63-2002 file with a smooth, downward facing
+    # distribution plus a little noise
+    num_v = kwargs.get('num_vertical', 37)
+    num_h = kwargs.get('num_horizontal', 1)
+    sym = kwargs.get('symmetry', 'rotational')
+    wrap = kwargs.get('wrap', 10)
+    rand = random.Random(kwargs.get('seed', 0))
+    if sym == 'rotational':
+        num_h = 1
+    h_start, h_end = SYMMETRY_RANGES[sym]
+    v_angles = np.linspace(0., 180., num_v)
+    h_angles = np.linspace(h_start, h_end, num_h)
+    lines = [
+        'IESNA:LM-63-2002',
+        '[TEST] synthetic %dx%d' % (num_v, num_h),
+        '[MANUFAC] benchmark',
+        '[LUMCAT] SYN-%s-%d' % (sym, kwargs.get('seed', 0)),
+        '[LUMINAIRE] synthetic %s' % (sym),
+        'TILT=NONE',
+        '1 1000.0 1.0 %d %d 1 2 0.1 0.1 0.05' % (num_v, num_h),
+        '1.0 1.0 20.0',
+    ]
+    def add_values(values):
+        values = ['%.2f' % v for v in values]
+        for i in range(0, len(values), wrap):
+            lines.append(' '.join(values[i:i + wrap]))
+    add_values(v_angles)
+    add_values(h_angles)
+    falloff = np.clip(np.cos(np.radians(v_angles)), 0., 1.) ** 2
+    for h in h_angles:
+        noise = np.array([rand.random() for v in v_angles])
+        add_values(500. * falloff * (1. + .1 * np.cos(np.radians(h))) + noise)
+    with open(filename, 'w') as f:
+        f.write('\r\n'.join(lines))
+        f.write('\r\n')
+
+def generate_files(path, num_files, **kwargs):
+    filenames = []
+    seed = kwargs.pop('seed', 0)
+    for i in range(num_files):
+        fn = os.path.join(path, 'synthetic_%05d.ies' % (i))
+        generate_ies(fn, seed=seed + i, **kwargs)
+        filenames.append(fn)
+    return filenames
+
+def measure(func, items, repeat=1):
+    # Best wall time over repeat untraced runs, then the peak traced
+    # allocation from one separate run (tracing slows allocation heavy code,
+    # object mode especially, so it is kept out of the timings)
+    best = None
+    result = None
+    for i in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = [func(item) for item in items]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = [func(item) for item in items]
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+def run_case(path, **kwargs):
+    num_files = kwargs.get('num_files', 10)
+    repeat = kwargs.get('repeat', 3)
+    grid = dict(
+        num_vertical=kwargs.get('num_vertical', 37),
+        num_horizontal=kwargs.get('num_horizontal', 1),
+        symmetry=kwargs.get('symmetry', 'rotational'),
+        wrap=kwargs.get('wrap', 10),
+    )
+    filenames = generate_files(path, num_files, seed=kwargs.get('seed', 0), **grid)
+    num_samples = grid['num_vertical'] * (
+        1 if grid['symmetry'] == 'rotational' else grid['num_horizontal'])
+    results = {}
+    def add_result(name, elapsed, peak):
+        results[name] = {
+            'seconds':elapsed,
+            'files_per_sec':num_files / elapsed if elapsed else None,
+            'samples_per_sec':num_files * num_samples / elapsed if elapsed else None,
+            'peak_memory':peak,
+        }
+    for dense in [False, True]:
+        suffix = 'dense' if dense else 'objects'
+        elapsed, peak, parsed = measure(
+            lambda fn: do_parse(fn, dense=dense), filenames, repeat)
+        add_result('do_parse_%s' % (suffix), elapsed, peak)
+        elapsed, peak, data = measure(lambda d: IESData(**d), parsed, repeat)
+        add_result('construct_%s' % (suffix), elapsed, peak)
+        elapsed, peak, r = measure(
+            lambda d: list(d.iter_candela_computed()), data, repeat)
+        add_result('iter_candela_computed_%s' % (suffix), elapsed, peak)
+    for compact in [False, True]:
+        suffix = 'compact' if compact else 'verbose'
+        def round_trip(d):
+            s = json.dumps(d, cls=IESJSONEncoder, compact=compact)
+            return json.loads(s, cls=IESJSONDecoder)
+        elapsed, peak, r = measure(round_trip, data, repeat)
+        add_result('json_round_trip_%s' % (suffix), elapsed, peak)
+    for fn in filenames:
+        os.remove(fn)
+    case = dict(grid, num_files=num_files, num_samples=num_samples)
+    return {'case':case, 'results':results}
+
+def parse_grid(s):
+    num_v, num_h = s.lower().split('x')
+    return int(num_v), int(num_h)
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='Benchmark iesparser')
+    p.add_argument('--grid', action='append',
+                   help='vertical x horizontal angles, e.g. 181x73 (repeatable)')
+    p.add_argument('--symmetry', default='none', choices=sorted(SYMMETRY_RANGES))
+    p.add_argument('--wrap', type=int, default=10, help='values per line')
+    p.add_argument('--files', type=int, default=10, help='files per case')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--output', help='write JSON results here instead of stdout')
+    o = p.parse_args(args)
+    grids = [parse_grid(g) for g in (o.grid or ['37x1', '73x37', '181x73'])]
+    report = {
+        'python':platform.python_version(),
+        'numpy':np.__version__,
+        'platform':platform.platform(),
+        'cases':[],
+    }
+    path = tempfile.mkdtemp(prefix='iesbench')
+    try:
+        for num_v, num_h in grids:
+            report['cases'].append(run_case(
+                path,
+                num_vertical=num_v,
+                num_horizontal=num_h,
+                symmetry=o.symmetry,
+                wrap=o.wrap,
+                num_files=o.files,
+                repeat=o.repeat,
+                seed=o.seed,
+            ))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    if o.output:
+        with open(o.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return report
+
+if __name__ == '__main__':
+    main()
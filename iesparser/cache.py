@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from . import IESData
+
+DEFAULT_CACHE_DIR = '~/.cache/iesparser'
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+CACHE_VERSION = 1
+
+def hash_file(filename, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+class IESCache(object):
+    # Each entry is a small JSON header (<key>.json) with the file stats,
+    # keywords and fields, plus a single float64 .npy array (<key>.npy)
+    # holding the vertical angles, horizontal angles and candela values.
+    # The array is loaded memory-mapped, so a cache hit never calls do_parse.
+    def __init__(self, **kwargs):
+        path = kwargs.get('path', DEFAULT_CACHE_DIR)
+        self.path = os.path.expanduser(path)
+        self.max_size = kwargs.get('max_size', DEFAULT_MAX_SIZE)
+        self.mmap = kwargs.get('mmap', True)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+    def get_key(self, filename):
+        filename = os.path.abspath(os.path.expanduser(filename))
+        return hashlib.sha1(filename.encode('utf-8')).hexdigest()
+    def get_entry_paths(self, key):
+        base = os.path.join(self.path, key)
+        return base + '.json', base + '.npy'
+    def load(self, filename):
+        data = self.get(filename)
+        if data is None:
+            data = IESData.from_file(filename, dense=True)
+            self.store(filename, data)
+        return data
+    def get(self, filename):
+        key = self.get_key(filename)
+        header_fn, array_fn = self.get_entry_paths(key)
+        header = self._read_header(header_fn)
+        if header is None:
+            return None
+        st = os.stat(filename)
+        if header['mtime'] != st.st_mtime or header['size'] != st.st_size:
+            # Stats changed, but the content may not have (e.g. a fresh
+            # checkout or a touched file)
+            if header['size'] != st.st_size:
+                return None
+            if header['hash'] != hash_file(filename):
+                return None
+            header['mtime'] = st.st_mtime
+            self._write_header(header_fn, header)
+        try:
+            values = np.load(array_fn, mmap_mode='r' if self.mmap else None)
+        except (IOError, ValueError):
+            self.invalidate(filename)
+            return None
+        # Mark as recently used for eviction
+        os.utime(header_fn, None)
+        return self._build_data(filename, header, values)
+    def _build_data(self, filename, header, values):
+        num_v, num_h = header['shape']
+        return IESData(
+            filename=filename,
+            keywords=header['keywords'],
+            fields=header['fields'],
+            angles={
+                'vertical':values[:num_v],
+                'horizontal':values[num_v:num_v + num_h],
+            },
+            candela_array=values[num_v + num_h:].reshape(num_v, num_h),
+        )
+    def store(self, filename, data, file_hash=None):
+        key = self.get_key(filename)
+        header_fn, array_fn = self.get_entry_paths(key)
+        st = os.stat(filename)
+        if file_hash is None:
+            file_hash = hash_file(filename)
+        candela = data.candela_array
+        values = np.concatenate([
+            data.vertical_angles, data.horizontal_angles, candela.ravel()])
+        header = {
+            'version':CACHE_VERSION,
+            'filename':os.path.abspath(filename),
+            'mtime':st.st_mtime,
+            'size':st.st_size,
+            'hash':file_hash,
+            'shape':[data.vertical_angles.size, data.horizontal_angles.size],
+            'keywords':{k: v.value for k, v in data.keywords.items()},
+            'fields':{k: v.value for k, v in data.fields.items()},
+        }
+        # Write the array first; an entry only exists once its header does
+        tmp_fn = array_fn + '.tmp'
+        with open(tmp_fn, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_fn, array_fn)
+        self._write_header(header_fn, header)
+        self.evict()
+    def _read_header(self, header_fn):
+        try:
+            with open(header_fn, 'r') as f:
+                header = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if header.get('version') != CACHE_VERSION:
+            return None
+        return header
+    def _write_header(self, header_fn, header):
+        tmp_fn = header_fn + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_fn, header_fn)
+    def invalidate(self, filename):
+        key = self.get_key(filename)
+        for fn in self.get_entry_paths(key):
+            if os.path.exists(fn):
+                os.remove(fn)
+    def clear(self):
+        for fn in os.listdir(self.path):
+            if os.path.splitext(fn)[1] in ['.json', '.npy', '.tmp']:
+                os.remove(os.path.join(self.path, fn))
+    def iter_entries(self):
+        for fn in os.listdir(self.path):
+            key, ext = os.path.splitext(fn)
+            if ext != '.json':
+                continue
+            header_fn, array_fn = self.get_entry_paths(key)
+            size = os.path.getsize(header_fn)
+            if os.path.exists(array_fn):
+                size += os.path.getsize(array_fn)
+            yield key, os.path.getmtime(header_fn), size
+    @property
+    def size(self):
+        return sum(size for key, atime, size in self.iter_entries())
+    def evict(self, max_size=None):
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return
+        entries = sorted(self.iter_entries(), key=lambda e: e[1])
+        total = sum(e[2] for e in entries)
+        # Least recently used entries go first
+        for key, atime, size in entries:
+            if total <= max_size:
+                break
+            for fn in self.get_entry_paths(key):
+                if os.path.exists(fn):
+                    os.remove(fn)
+            total -= size
@@ -0,0 +1,122 @@
+import numpy as np
+
+from . import IESData
+from .interpolate import AngleAxis, GridSampler
+
+TYPE_C = 1
+TYPE_B = 2
+TYPE_A = 3
+
+# Luminaire frame used for the conversion: the Type A/B optical axis
+# becomes Type C nadir, the lateral axis points along C90 and positive
+# Type A/B vertical angles tilt towards C0.
+OPTICAL_AXIS = np.array([0., 0., -1.])
+LATERAL_AXIS = np.array([0., 1., 0.])
+UP_AXIS = np.array([1., 0., 0.])
+
+_directions = {}
+_samplers = {}
+MAX_CACHED = 32
+
+def get_type_c_directions(vertical_angles, horizontal_angles):
+    key = (vertical_angles.tobytes(), horizontal_angles.tobytes())
+    d = _directions.get(key)
+    if d is None:
+        if len(_directions) >= MAX_CACHED:
+            _directions.clear()
+        v, h = np.meshgrid(
+            np.radians(vertical_angles), np.radians(horizontal_angles),
+            indexing='ij')
+        d = np.stack([
+            np.sin(v) * np.cos(h),
+            np.sin(v) * np.sin(h),
+            -np.cos(v),
+        ], axis=-1)
+        _directions[key] = d
+    return d
+
+def directions_to_source_angles(directions, photometric_type):
+    # Returns (vertical, horizontal) Type A or B angles and a mask of the
+    # directions that fall behind the luminaire (outside +/-90 degrees)
+    a = directions.dot(OPTICAL_AXIS)
+    l = np.clip(directions.dot(LATERAL_AXIS), -1., 1.)
+    u = np.clip(directions.dot(UP_AXIS), -1., 1.)
+    if photometric_type == TYPE_B:
+        # Planes rotate about the lateral axis
+        horizontal = np.degrees(np.arcsin(l))
+        vertical = np.degrees(np.arctan2(u, a))
+    elif photometric_type == TYPE_A:
+        # Planes rotate about the up axis
+        vertical = np.degrees(np.arcsin(u))
+        horizontal = np.degrees(np.arctan2(l, a))
+    else:
+        raise ValueError('Unsupported photometric type: %r' % (photometric_type))
+    outside = (np.abs(vertical) > 90.) | (np.abs(horizontal) > 90.)
+    return vertical, horizontal, outside
+
+def get_conversion_sampler(data, vertical_angles, horizontal_angles, mode):
+    photometric_type = data.photometric_type.value
+    key = (
+        photometric_type,
+        data.vertical_angles.tobytes(), data.horizontal_angles.tobytes(),
+        vertical_angles.tobytes(), horizontal_angles.tobytes(), mode,
+    )
+    cached = _samplers.get(key)
+    if cached is not None:
+        return cached
+    if len(_samplers) >= MAX_CACHED:
+        _samplers.clear()
+    directions = get_type_c_directions(vertical_angles, horizontal_angles)
+    vertical, horizontal, outside = directions_to_source_angles(
+        directions, photometric_type)
+    if data.horizontal_angles[0] >= 0.:
+        # Only one side stored; symmetric about the vertical plane
+        horizontal = np.abs(horizontal)
+    v_axis = AngleAxis(data.vertical_angles)
+    h_axis = AngleAxis(data.horizontal_angles)
+    # Directions outside the measured range get no light
+    outside |= (vertical < v_axis.angles[0]) | (vertical > v_axis.angles[-1])
+    outside |= (horizontal < h_axis.angles[0]) | (horizontal > h_axis.angles[-1])
+    sampler = GridSampler(
+        vertical_axis=v_axis,
+        horizontal_axis=h_axis,
+        vertical=vertical,
+        horizontal=horizontal,
+        mode=mode,
+    )
+    _samplers[key] = (sampler, outside)
+    return sampler, outside
+
+def convert_to_type_c(data, **kwargs):
+    photometric_type = data.photometric_type.value
+    if photometric_type == TYPE_C:
+        return data
+    vertical_angles = kwargs.get('vertical_angles')
+    if vertical_angles is None:
+        vertical_angles = np.arange(0., 180. + 1e-9, kwargs.get('vertical_step', 2.5))
+    horizontal_angles = kwargs.get('horizontal_angles')
+    if horizontal_angles is None:
+        horizontal_angles = np.arange(
+            0., 360. + 1e-9, kwargs.get('horizontal_step', 5.))
+    vertical_angles = np.asarray(vertical_angles, dtype=float)
+    horizontal_angles = np.asarray(horizontal_angles, dtype=float)
+    mode = kwargs.get('mode', 'bilinear')
+    values = data.candela_array
+    sampler, outside = get_conversion_sampler(
+        data, vertical_angles, horizontal_angles, mode)
+    candela = sampler(values)
+    candela[outside] = 0.
+    np.maximum(candela, 0., out=candela)
+    fields = {k: v.value for k, v in data.fields.items()}
+    fields.update(
+        photometric_type=TYPE_C,
+        num_vertical_angles=vertical_angles.size,
+        num_horizontal_angles=horizontal_angles.size,
+    )
+    return IESData(
+        filename=data.filename,
+        keywords={k: v.value for k, v in data.keywords.items()},
+        fields=fields,
+        angles={'vertical':vertical_angles, 'horizontal':horizontal_angles},
+        candela_array=candela,
+    )
@@ -0,0 +1,153 @@
+import hashlib
+import itertools
+
+import numpy as np
+
+from . import IESData
+from .batch import map_files
+
+DEFAULT_TOLERANCE = .01
+DEFAULT_RESOLUTION = (37, 72)
+
+def get_fingerprint_angles(resolution):
+    num_v, num_h = resolution
+    vertical = np.linspace(0., 180., num_v)
+    horizontal = np.arange(num_h) * (360. / num_h)
+    return np.meshgrid(vertical, horizontal, indexing='ij')
+
+def fingerprint(data, resolution=DEFAULT_RESOLUTION):
+    # Unit length vector describing the shape of the distribution,
+    # independent of the stored angles, symmetry and overall intensity.
+    # Samples are weighted by sqrt(sin(vertical)) so the euclidean distance
+    # between two fingerprints follows the difference over the sphere.
+    if data.photometric_type.value != 1:
+        data = data.to_type_c()
+    vertical, horizontal = get_fingerprint_angles(resolution)
+    values = data.interpolate(vertical, horizontal)
+    weights = np.sqrt(np.sin(np.radians(vertical)))
+    # Keep the poles from vanishing completely
+    weights[0] = weights[-1] = np.sqrt(np.sin(np.radians(vertical[1])) * .5)
+    values = (values * weights).ravel()
+    norm = np.sqrt((values ** 2).sum())
+    if norm > 0:
+        values = values / norm
+    return values.astype(np.float32)
+
+def exact_hash(data):
+    # Identical grids and multipliers produce the same hash
+    h = hashlib.sha1()
+    h.update(data.vertical_angles.tobytes())
+    h.update(data.horizontal_angles.tobytes())
+    h.update(np.ascontiguousarray(data.get_computed_array()).tobytes())
+    return h.hexdigest()
+
+def fingerprint_file(filename, resolution=DEFAULT_RESOLUTION):
+    # Runs in worker processes
+    try:
+        data = IESData.from_file(filename, dense=True)
+        return filename, exact_hash(data), fingerprint(data, resolution)
+    except Exception:
+        return filename, None, None
+
+class DuplicateFinder(object):
+    # Candidate pairs come from a grid over a few random projections of the
+    # fingerprints. Projection is 1-Lipschitz, so two fingerprints within
+    # tolerance always land in the same or neighboring cells and no
+    # duplicate is missed without comparing every pair.
+    def __init__(self, **kwargs):
+        self.tolerance = kwargs.get('tolerance', DEFAULT_TOLERANCE)
+        self.resolution = kwargs.get('resolution', DEFAULT_RESOLUTION)
+        self.num_projections = kwargs.get('num_projections', 3)
+        self.seed = kwargs.get('seed', 0)
+        self.chunk_size = kwargs.get('chunk_size', 256)
+        self.keys = []
+        self.hashes = []
+        self.fingerprints = []
+    def add(self, key, data):
+        self.add_fingerprint(key, exact_hash(data), fingerprint(data, self.resolution))
+    def add_fingerprint(self, key, exact, fp):
+        self.keys.append(key)
+        self.hashes.append(exact)
+        self.fingerprints.append(fp)
+    def add_files(self, filenames, **kwargs):
+        if kwargs.get('parallel', True):
+            results = map_files(
+                fingerprint_file, filenames,
+                args=[self.resolution],
+                max_workers=kwargs.get('max_workers'),
+            )
+        else:
+            results = [fingerprint_file(fn, self.resolution) for fn in filenames]
+        errors = []
+        for filename, exact, fp in results:
+            if fp is None:
+                errors.append(filename)
+                continue
+            self.add_fingerprint(filename, exact, fp)
+        return errors
+    def exact_groups(self):
+        groups = {}
+        for key, exact in zip(self.keys, self.hashes):
+            groups.setdefault(exact, []).append(key)
+        return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+    def get_projections(self, fingerprints):
+        rand = np.random.RandomState(self.seed)
+        m = rand.normal(size=(fingerprints.shape[1], self.num_projections))
+        q, r = np.linalg.qr(m)
+        return fingerprints.dot(q)
+    def find_pairs(self):
+        if len(self.fingerprints) < 2:
+            return []
+        fps = np.array(self.fingerprints, dtype=np.float64)
+        norms = (fps ** 2).sum(axis=1)
+        tol = self.tolerance
+        cells = np.floor(self.get_projections(fps) / tol).astype(np.int64)
+        buckets = {}
+        for i, cell in enumerate(map(tuple, cells.tolist())):
+            buckets.setdefault(cell, []).append(i)
+        offsets = list(itertools.product([-1, 0, 1], repeat=self.num_projections))
+        pairs = []
+        for cell, members in buckets.items():
+            candidates = []
+            for offset in offsets:
+                neighbor = tuple(c + o for c, o in zip(cell, offset))
+                candidates.extend(buckets.get(neighbor, []))
+            if len(candidates) < 2:
+                continue
+            members = np.array(members)
+            candidates = np.array(candidates)
+            c_fps = fps[candidates]
+            c_norms = norms[candidates]
+            for start in range(0, members.size, self.chunk_size):
+                chunk = members[start:start + self.chunk_size]
+                dist = norms[chunk][:, None] + c_norms[None, :]
+                dist -= 2. * fps[chunk].dot(c_fps.T)
+                for i, j in zip(*np.nonzero(dist <= tol * tol)):
+                    a, b = chunk[i], candidates[j]
+                    if a < b:
+                        pairs.append((int(a), int(b)))
+        return pairs
+    def find_groups(self):
+        # Union-find over exact and near duplicate pairs
+        parent = list(range(len(self.keys)))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        first = {}
+        for i, exact in enumerate(self.hashes):
+            j = first.setdefault(exact, i)
+            if j != i:
+                parent[find(i)] = find(j)
+        for a, b in self.find_pairs():
+            parent[find(a)] = find(b)
+        groups = {}
+        for i, key in enumerate(self.keys):
+            groups.setdefault(find(i), []).append(key)
+        return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+def find_duplicates(filenames, **kwargs):
+    finder = DuplicateFinder(**kwargs)
+    finder.add_files(filenames, **kwargs)
+    return finder.find_groups()
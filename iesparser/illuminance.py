@@ -0,0 +1,77 @@
+import numpy as np
+
+from .interpolate import directions_to_angles
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+def get_luminaire_frame(aim, spin=0.):
+    # Columns are the luminaire's local X (C0), Y (C90) and Z axes in world
+    # space. Local -Z (Type C nadir) points along aim.
+    aim = np.asarray(aim, dtype=float)
+    z = -aim / np.sqrt((aim ** 2).sum())
+    ref = np.array([1., 0., 0.])
+    if abs(z.dot(ref)) > .99:
+        ref = np.array([0., 1., 0.])
+    x = ref - z * z.dot(ref)
+    x /= np.sqrt((x ** 2).sum())
+    y = np.cross(z, x)
+    if spin:
+        a = np.radians(spin)
+        x, y = x * np.cos(a) + y * np.sin(a), y * np.cos(a) - x * np.sin(a)
+    return np.stack([x, y, z], axis=1)
+
+class Luminaire(object):
+    def __init__(self, **kwargs):
+        self.data = kwargs.get('data')
+        self.position = np.asarray(kwargs.get('position', [0., 0., 0.]), dtype=float)
+        self.aim = kwargs.get('aim', [0., 0., -1.])
+        self.spin = kwargs.get('spin', 0.)
+        self.multiplier = kwargs.get('multiplier', 1.)
+        self.frame = get_luminaire_frame(self.aim, self.spin)
+
+def work_plane_grid(x_range, y_range, spacing, height=0.):
+    x = np.arange(x_range[0], x_range[1] + spacing * .5, spacing)
+    y = np.arange(y_range[0], y_range[1] + spacing * .5, spacing)
+    gx, gy = np.meshgrid(x, y, indexing='ij')
+    points = np.stack([gx.ravel(), gy.ravel(), np.full(gx.size, float(height))], axis=1)
+    return points, gx.shape
+
+def calc_illuminance(luminaires, points, **kwargs):
+    # Returns horizontal (normal +Z) and vertical (normal vertical_normal)
+    # illuminance at each point, summed over all luminaires. Luminaires
+    # sharing an IESData are evaluated together; work is split so at most
+    # chunk_size (point, luminaire) pairs are in memory at once.
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    chunk_size = kwargs.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    mode = kwargs.get('mode', 'bilinear')
+    v_normal = np.asarray(kwargs.get('vertical_normal', [0., 1., 0.]), dtype=float)
+    v_normal = v_normal / np.sqrt((v_normal ** 2).sum())
+    horizontal = np.zeros(len(points))
+    vertical = np.zeros(len(points))
+    groups = {}
+    for lum in luminaires:
+        groups.setdefault(id(lum.data), []).append(lum)
+    for group in groups.values():
+        data = group[0].data
+        positions = np.array([lum.position for lum in group])
+        frames = np.array([lum.frame for lum in group])
+        multipliers = np.array([lum.multiplier for lum in group], dtype=float)
+        step = max(1, chunk_size // len(group))
+        for start in range(0, len(points), step):
+            p = points[start:start + step]
+            # (luminaires, points, 3) vectors from each luminaire
+            v = p[None, :, :] - positions[:, None, :]
+            dist_sq = (v ** 2).sum(axis=-1)
+            dist_sq[dist_sq == 0] = np.inf
+            direction = v / np.sqrt(dist_sq)[..., None]
+            local = np.einsum('lpi,lij->lpj', direction, frames)
+            v_angles, h_angles = directions_to_angles(local)
+            intensity = data.interpolate(v_angles, h_angles, mode=mode)
+            intensity *= multipliers[:, None]
+            e = intensity / dist_sq
+            # Light travels along direction, so it hits surfaces facing -direction
+            cos_h = np.clip(-direction[..., 2], 0., None)
+            cos_v = np.clip(-direction.dot(v_normal), 0., None)
+            horizontal[start:start + step] += (e * cos_h).sum(axis=0)
+            vertical[start:start + step] += (e * cos_v).sum(axis=0)
+    return horizontal, vertical
@@ -0,0 +1,103 @@
+import numpy as np
+
+INTERPOLATION_MODES = ['bilinear', 'bicubic']
+
+def directions_to_angles(directions):
+    # Type C convention: vertical 0 points down (-Z), 180 points up;
+    # horizontal 0 is along +X and 90 along +Y
+    d = np.asarray(directions, dtype=float)
+    length = np.sqrt((d ** 2).sum(axis=-1))
+    length[length == 0] = 1.
+    z = np.clip(-d[..., 2] / length, -1., 1.)
+    vertical = np.degrees(np.arccos(z))
+    horizontal = np.degrees(np.arctan2(d[..., 1], d[..., 0])) % 360.
+    return vertical, horizontal
+
+class AngleAxis(object):
+    def __init__(self, angles):
+        self.angles = np.asarray(angles, dtype=float)
+        self.size = self.angles.size
+        self.step = None
+        if self.size > 1:
+            diffs = np.diff(self.angles)
+            if np.allclose(diffs, diffs[0]):
+                self.step = float(diffs[0])
+    @property
+    def uniform(self):
+        return self.step is not None
+    def locate(self, values):
+        # Returns the lower bin index and the fractional position within
+        # the bin for each value, clamped to the ends of the axis
+        values = np.asarray(values, dtype=float)
+        if self.size < 2:
+            zeros = np.zeros(values.shape)
+            return zeros.astype(np.intp), zeros
+        a = self.angles
+        values = np.clip(values, a[0], a[-1])
+        if self.uniform:
+            index = ((values - a[0]) / self.step).astype(np.intp)
+        else:
+            index = np.searchsorted(a, values, side='right') - 1
+        index = np.clip(index, 0, self.size - 2)
+        frac = (values - a[index]) / (a[index + 1] - a[index])
+        return index, frac
+
+def get_weights(frac, mode):
+    if mode == 'bilinear':
+        return [0, 1], [1. - frac, frac]
+    if mode == 'bicubic':
+        # Catmull-Rom
+        t = frac
+        t2 = t * t
+        t3 = t2 * t
+        return [-1, 0, 1, 2], [
+            .5 * (-t3 + 2. * t2 - t),
+            .5 * (3. * t3 - 5. * t2 + 2.),
+            .5 * (-3. * t3 + 4. * t2 + t),
+            .5 * (t3 - t2),
+        ]
+    raise ValueError('Unknown interpolation mode: %r' % (mode))
+
+class GridSampler(object):
+    # Precomputed flat grid indices and weights for a set of sample angles.
+    # Can be reused for any candela array with the same angle grid.
+    def __init__(self, **kwargs):
+        v_axis = kwargs.get('vertical_axis')
+        h_axis = kwargs.get('horizontal_axis')
+        mode = self.mode = kwargs.get('mode', 'bilinear')
+        vertical = np.asarray(kwargs.get('vertical'), dtype=float)
+        horizontal = kwargs.get('horizontal')
+        if horizontal is None:
+            horizontal = np.zeros(vertical.shape)
+        vertical, horizontal = np.broadcast_arrays(
+            vertical, np.asarray(horizontal, dtype=float))
+        self.shape = vertical.shape
+
+        v_index, v_frac = v_axis.locate(vertical.ravel())
+        # Optional map from horizontal axis positions to stored columns
+        # (see symmetry.expand_horizontal)
+        h_map = kwargs.get('horizontal_map')
+        num_columns = h_axis.size if h_map is None else int(h_map.max()) + 1
+        h_index, h_frac = h_axis.locate(horizontal.ravel())
+        v_offsets, v_weights = get_weights(v_frac, mode)
+        h_offsets, h_weights = get_weights(h_frac, mode)
+        indices = []
+        weights = []
+        for vo, vw in zip(v_offsets, v_weights):
+            vi = np.clip(v_index + vo, 0, v_axis.size - 1)
+            for ho, hw in zip(h_offsets, h_weights):
+                hi = np.clip(h_index + ho, 0, h_axis.size - 1)
+                if h_map is not None:
+                    hi = h_map[hi]
+                indices.append(vi * num_columns + hi)
+                weights.append(vw * hw)
+        self.grid_shape = (v_axis.size, num_columns)
+        self.indices = np.array(indices)
+        self.weights = np.array(weights)
+    def __call__(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.shape != self.grid_shape:
+            raise ValueError('Grid shape %r does not match %r' % (
+                values.shape, self.grid_shape))
+        result = (values.ravel()[self.indices] * self.weights).sum(axis=0)
+        return result.reshape(self.shape)
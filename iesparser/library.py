@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import uuid
+
+import numpy as np
+
+from . import IESData
+from .batch import find_ies_files, map_files
+
+INDEX_VERSION = 1
+KEYWORD_FIELDS = ['MANUFAC', 'LUMCAT', 'LUMINAIRE', 'LAMPCAT', 'LAMP', 'TEST']
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def split_words(s):
+    return set(WORD_RE.findall(s.lower()))
+
+def build_entry(filename):
+    # Runs in worker processes, so only plain data is returned
+    st = os.stat(filename)
+    entry = {'filename':filename, 'mtime':st.st_mtime, 'size':st.st_size}
+    try:
+        data = IESData.from_file(filename, dense=True)
+        photometry = data.get_photometry()
+        fields = data.fields
+        entry['keywords'] = {k: v.value.strip() for k, v in data.keywords.items()}
+        entry['values'] = {
+            'lumens':photometry.total_flux,
+            'lamp_lumens':photometry.lamp_lumens,
+            'input_watts':fields['input_watts'].value,
+            'beam_angle':photometry.beam_angle,
+            'field_angle':photometry.field_angle,
+            'width':fields['width'].value,
+            'length':fields['length'].value,
+            'height':fields['height'].value,
+        }
+    except Exception as e:
+        entry['error'] = '%s: %s' % (e.__class__.__name__, e)
+    return entry
+
+def find_term(postings, word):
+    terms, offsets, ids = postings
+    i = np.searchsorted(terms, word)
+    if i < terms.size and terms[i] == word:
+        return ids[offsets[i]:offsets[i + 1]]
+    return np.array([], dtype=np.int64)
+
+def empty_index():
+    return {'filenames':np.array([], dtype=str), 'words':{}, 'columns':{}}
+
+def update_index(index, removed, added):
+    # Returns the index with the filenames in removed dropped and the entries
+    # in added (re)inserted. Ids are positions in the sorted filenames, so
+    # the existing postings are remapped with array operations and only the
+    # added entries are split into words.
+    #   words:   {keyword: (sorted terms, offsets, ids)}, the ids for
+    #            terms[i] being ids[offsets[i]:offsets[i + 1]]
+    #   columns: {name: (sorted values, ids)}
+    # Entries that now fail to parse still replace their old postings
+    drop = set(removed) | set(e['filename'] for e in added)
+    added = [e for e in added if 'error' not in e]
+    added_fns = [e['filename'] for e in added]
+    old_fns = index['filenames']
+    keep = ~np.isin(old_fns, list(drop))
+    filenames = np.array(sorted(set(old_fns[keep].tolist()) | set(added_fns)), dtype=str)
+    remap = np.full(old_fns.size, -1, dtype=np.int64)
+    remap[keep] = np.searchsorted(filenames, old_fns[keep])
+    added_ids = np.searchsorted(filenames, np.array(added_fns, dtype=str)).tolist()
+    words = {}
+    keys = set(index['words']) | set(k for e in added for k in e['keywords'])
+    for key in keys:
+        all_terms = []
+        all_ids = []
+        if key in index['words']:
+            terms, offsets, ids = index['words'][key]
+            terms = np.repeat(terms, np.diff(offsets))
+            ids = remap[ids]
+            all_terms.append(terms[ids >= 0])
+            all_ids.append(ids[ids >= 0])
+        new_terms = []
+        new_ids = []
+        for e, i in zip(added, added_ids):
+            value = e['keywords'].get(key)
+            if value is None:
+                continue
+            for word in split_words(value):
+                new_terms.append(word)
+                new_ids.append(i)
+        all_terms.append(np.array(new_terms, dtype=str))
+        all_ids.append(np.array(new_ids, dtype=np.int64))
+        terms = np.concatenate(all_terms)
+        ids = np.concatenate(all_ids)
+        if not terms.size:
+            continue
+        terms, inverse = np.unique(terms, return_inverse=True)
+        order = np.lexsort((ids, inverse))
+        offsets = np.zeros(terms.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inverse, minlength=terms.size), out=offsets[1:])
+        words[key] = (terms, offsets, ids[order])
+    columns = {}
+    keys = set(index['columns']) | set(k for e in added for k in e['values'])
+    for key in keys:
+        all_values = []
+        all_ids = []
+        if key in index['columns']:
+            values, ids = index['columns'][key]
+            ids = remap[ids]
+            all_values.append(values[ids >= 0])
+            all_ids.append(ids[ids >= 0])
+        pairs = [(e['values'][key], i) for e, i in zip(added, added_ids)
+                 if e['values'].get(key) is not None]
+        all_values.append(np.array([v for v, i in pairs], dtype=float))
+        all_ids.append(np.array([i for v, i in pairs], dtype=np.int64))
+        values = np.concatenate(all_values)
+        ids = np.concatenate(all_ids)
+        if not values.size:
+            continue
+        order = np.lexsort((ids, values))
+        columns[key] = (values[order], ids[order])
+    return {'filenames':filenames, 'words':words, 'columns':columns}
+
+def save_index_arrays(fileobj, index, arrays_id):
+    arrays = {'arrays_id':np.array(arrays_id), 'filenames':index['filenames']}
+    word_keys = sorted(index['words'])
+    column_keys = sorted(index['columns'])
+    arrays['word_keys'] = np.array(word_keys, dtype=str)
+    arrays['column_keys'] = np.array(column_keys, dtype=str)
+    for i, key in enumerate(word_keys):
+        terms, offsets, ids = index['words'][key]
+        arrays['words_%d_terms' % (i)] = terms
+        arrays['words_%d_offsets' % (i)] = offsets
+        arrays['words_%d_ids' % (i)] = ids
+    for i, key in enumerate(column_keys):
+        values, ids = index['columns'][key]
+        arrays['columns_%d_values' % (i)] = values
+        arrays['columns_%d_ids' % (i)] = ids
+    np.savez(fileobj, **arrays)
+
+def load_index_arrays(filename, arrays_id):
+    # Returns None if the arrays are missing or weren't saved with the
+    # entries they are being loaded for
+    try:
+        npz = np.load(filename, allow_pickle=False)
+    except (IOError, ValueError):
+        return None
+    with npz:
+        if 'arrays_id' not in npz.files or npz['arrays_id'].item() != arrays_id:
+            return None
+        index = empty_index()
+        index['filenames'] = npz['filenames']
+        for i, key in enumerate(npz['word_keys'].tolist()):
+            index['words'][key] = tuple(
+                npz['words_%d_%s' % (i, name)] for name in ['terms', 'offsets', 'ids'])
+        for i, key in enumerate(npz['column_keys'].tolist()):
+            index['columns'][key] = tuple(
+                npz['columns_%d_%s' % (i, name)] for name in ['values', 'ids'])
+    return index
+
+class LibraryIndex(object):
+    # Index over the headers and photometric summaries of a directory of
+    # IES files. Keyword values are held in an inverted word index and
+    # numeric values in sorted columns (see update_index). Both are saved
+    # to an .npz next to the JSON entries and updated incrementally, so
+    # neither loading nor updating rebuilds them from every entry.
+    def __init__(self, **kwargs):
+        self.path = kwargs.get('path')
+        self.entries = {}
+        self._index = None
+    @staticmethod
+    def get_arrays_filename(filename):
+        return os.path.splitext(filename)[0] + '.npz'
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as f:
+            d = json.load(f)
+        if d.get('version') != INDEX_VERSION:
+            raise ValueError('Unsupported index version: %r' % (d.get('version')))
+        index = cls(path=d.get('path'))
+        index.entries = {e['filename']: e for e in d['entries']}
+        arrays_id = d.get('arrays_id')
+        if arrays_id is not None:
+            index._index = load_index_arrays(
+                cls.get_arrays_filename(filename), arrays_id)
+        return index
+    def save(self, filename):
+        # The arrays are written first and tagged with an id stored in the
+        # JSON, so a stale or partially written .npz is never used
+        arrays_id = uuid.uuid4().hex
+        arrays_fn = self.get_arrays_filename(filename)
+        tmp_fn = arrays_fn + '.tmp'
+        with open(tmp_fn, 'wb') as f:
+            save_index_arrays(f, self.index, arrays_id)
+        os.replace(tmp_fn, arrays_fn)
+        d = {
+            'version':INDEX_VERSION,
+            'path':self.path,
+            'arrays_id':arrays_id,
+            'entries':[self.entries[fn] for fn in sorted(self.entries)],
+        }
+        tmp_fn = filename + '.tmp'
+        with open(tmp_fn, 'w') as f:
+            json.dump(d, f)
+        os.replace(tmp_fn, filename)
+    def update(self, path=None, **kwargs):
+        # Only new or modified files (by mtime and size) are parsed
+        if path is None:
+            path = self.path
+        else:
+            self.path = path
+        filenames = find_ies_files(path)
+        to_parse = []
+        for fn in filenames:
+            entry = self.entries.get(fn)
+            if entry is not None:
+                st = os.stat(fn)
+                if entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+                    continue
+            to_parse.append(fn)
+        removed = set(self.entries) - set(filenames)
+        for fn in removed:
+            del self.entries[fn]
+        if kwargs.get('parallel', True) and len(to_parse) > 1:
+            entries = map_files(
+                build_entry, to_parse,
+                max_workers=kwargs.get('max_workers'),
+                chunksize=kwargs.get('chunksize'),
+            )
+        else:
+            entries = [build_entry(fn) for fn in to_parse]
+        for entry in entries:
+            self.entries[entry['filename']] = entry
+        if self._index is not None and (to_parse or removed):
+            self._index = update_index(self._index, removed, entries)
+        return to_parse, sorted(removed)
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.build_index()
+        return self._index
+    def build_index(self):
+        entries = [self.entries[fn] for fn in sorted(self.entries)]
+        return update_index(empty_index(), [], entries)
+    def find_words(self, text, keyword=None):
+        words = self.index['words']
+        if keyword is None:
+            keys = [k for k in KEYWORD_FIELDS if k in words]
+        else:
+            keys = [keyword.upper()]
+        result = None
+        for word in split_words(text):
+            ids = [find_term(words[k], word) for k in keys if k in words]
+            ids = np.unique(np.concatenate(ids)) if ids else np.array([], dtype=int)
+            result = ids if result is None else np.intersect1d(result, ids)
+        return result
+    def find_range(self, name, minimum=None, maximum=None):
+        column = self.index['columns'].get(name)
+        if column is None:
+            return np.array([], dtype=int)
+        values, ids = column
+        start = 0 if minimum is None else np.searchsorted(values, minimum, 'left')
+        end = len(values) if maximum is None else np.searchsorted(values, maximum, 'right')
+        return np.sort(ids[start:end])
+    def query(self, text=None, keywords=None, **ranges):
+        # e.g. query(keywords={'LUMINAIRE':'downlight'},
+        #            lumens=(3000, 4000), input_watts=(None, 40))
+        result = None
+        sets = []
+        if text is not None:
+            sets.append(self.find_words(text))
+        if keywords is not None:
+            for key, text in keywords.items():
+                sets.append(self.find_words(text, key))
+        for name, (minimum, maximum) in ranges.items():
+            sets.append(self.find_range(name, minimum, maximum))
+        for ids in sets:
+            result = ids if result is None else np.intersect1d(result, ids)
+        filenames = self.index['filenames']
+        if result is None:
+            return filenames.tolist()
+        return filenames[result].tolist()
+    @property
+    def errors(self):
+        return {fn: e['error'] for fn, e in self.entries.items() if 'error' in e}
@@ -0,0 +1,96 @@
+import numpy as np
+
+class Photometry(object):
+    # Photometric summaries computed from the candela grid of an IESData.
+    # The grid is reduced to a horizontally averaged vertical profile,
+    # resampled at a fixed angular resolution and integrated piecewise.
+    def __init__(self, data, **kwargs):
+        self.data = data
+        self.resolution = kwargs.get('resolution', .1)
+        self.zone_width = kwargs.get('zone_width', 10.)
+        self._profile = None
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = self.build_profile()
+        return self._profile
+    def get_average_intensity(self):
+        data = self.data
+        values = data.get_computed_array()
+        # Trapezoid weights over the full 0-360 circle, folded back onto the
+        # stored columns through the symmetry index map
+        h_angles, index = data.symmetry_map
+        steps = np.diff(h_angles)
+        weights = np.zeros(h_angles.size)
+        weights[:-1] += steps * .5
+        weights[1:] += steps * .5
+        weights = np.bincount(index, weights, minlength=values.shape[1])
+        return values.dot(weights) / weights.sum()
+    def build_profile(self):
+        average = self.get_average_intensity()
+        num = int(round(180. / self.resolution)) + 1
+        angles = np.linspace(0., 180., num)
+        # Intensity outside of the measured vertical range is zero
+        intensity = np.interp(
+            angles, self.data.vertical_angles, average, left=0., right=0.)
+        return angles, intensity
+    def get_step_flux(self):
+        angles, intensity = self.profile
+        cos = np.cos(np.radians(angles))
+        mid = (intensity[1:] + intensity[:-1]) * .5
+        return 2. * np.pi * mid * (cos[:-1] - cos[1:])
+    @property
+    def total_flux(self):
+        return float(self.get_step_flux().sum())
+    @property
+    def zonal_lumens(self):
+        angles, intensity = self.profile
+        edges = np.arange(0., 180. + self.zone_width, self.zone_width)
+        edges = edges[edges <= 180.]
+        starts = np.searchsorted(angles[:-1], edges[:-1])
+        lumens = np.add.reduceat(self.get_step_flux(), starts)
+        return edges, lumens
+    @property
+    def lamp_lumens(self):
+        lumens = self.data.lumens_per_lamp.value
+        if lumens <= 0:
+            # -1 is used for absolute photometry
+            return None
+        return lumens * self.data.num_lamps.value
+    @property
+    def efficiency(self):
+        lamp_lumens = self.lamp_lumens
+        if lamp_lumens is None:
+            return None
+        return self.total_flux / lamp_lumens
+    def get_spread_angle(self, threshold):
+        angles, intensity = self.profile
+        peak_index = int(np.argmax(intensity))
+        peak = intensity[peak_index]
+        if peak <= 0:
+            return 0.
+        below = np.nonzero(intensity[peak_index:] < peak * threshold)[0]
+        if not below.size:
+            return 2. * float(angles[-1])
+        i = peak_index + below[0]
+        # Linear interpolation between the samples around the crossing
+        i0, i1 = intensity[i - 1], intensity[i]
+        frac = (i0 - peak * threshold) / (i0 - i1)
+        angle = angles[i - 1] + frac * (angles[i] - angles[i - 1])
+        return 2. * float(angle)
+    @property
+    def beam_angle(self):
+        return self.get_spread_angle(.5)
+    @property
+    def field_angle(self):
+        return self.get_spread_angle(.1)
+    def summary(self):
+        edges, lumens = self.zonal_lumens
+        return {
+            'total_flux':self.total_flux,
+            'zonal_lumens':lumens.tolist(),
+            'zone_edges':edges.tolist(),
+            'efficiency':self.efficiency,
+            'beam_angle':self.beam_angle,
+            'field_angle':self.field_angle,
+        }
@@ -0,0 +1,184 @@
+import os
+import gc
+import json
+import uuid
+
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+from . import IESData
+from .batch import parse_file, parse_files
+
+# Names of the blocks created by this process
+_created_blocks = set()
+
+def attach_block(name):
+    try:
+        # Python 3.13+: don't let the attaching process's resource tracker
+        # take ownership of the block
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        # Older versions register the block with this process's resource
+        # tracker, which would unlink it for every process when this one
+        # exits. Blocks created here stay registered for their owner.
+        if os.name == 'posix' and name not in _created_blocks:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+def create_block(name, nbytes):
+    _created_blocks.add(name)
+    return shared_memory.SharedMemory(name=name, create=True, size=max(1, nbytes))
+
+class SharedProfileStore(object):
+    # Profiles loaded once into three shared memory blocks:
+    #   <name>.h  JSON catalog (keywords, fields and array offsets)
+    #   <name>.a  float64 angle vectors, each distinct vector stored once
+    #   <name>.c  float32 candela grids
+    # Other processes attach() by name and get read-only, zero-copy views.
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name')
+        self.owner = kwargs.get('owner', False)
+        self.catalog = {}
+        self.blocks = {}
+        self._angles = None
+        self._candela = None
+    @classmethod
+    def create(cls, filenames, **kwargs):
+        name = kwargs.get('name')
+        if name is None:
+            name = 'ies%s' % (uuid.uuid4().hex[:12])
+        store = cls(name=name, owner=True)
+        filenames = list(filenames)
+        if kwargs.get('parallel', True) and len(filenames) > 1:
+            results = parse_files(filenames, max_workers=kwargs.get('max_workers'))
+        else:
+            results = [parse_file(fn) for fn in filenames]
+        errors = [r for r in results if not r.ok]
+        if errors and not kwargs.get('skip_errors', False):
+            raise ValueError('Could not parse %d file(s): %s' % (
+                len(errors), ', '.join(str(r) for r in errors)))
+        store.build([(r.filename, r.data) for r in results if r.ok])
+        return store
+    @classmethod
+    def attach(cls, name):
+        store = cls(name=name)
+        header = attach_block('%s.h' % (name))
+        store.blocks['h'] = header
+        size = int(np.frombuffer(header.buf, dtype=np.uint64, count=1)[0])
+        store.catalog = json.loads(bytes(header.buf[8:8 + size]).decode('utf-8'))
+        for key in ['a', 'c']:
+            store.blocks[key] = attach_block('%s.%s' % (name, key))
+        store._map_arrays()
+        return store
+    def build(self, profiles):
+        angle_offsets = {}
+        angle_chunks = []
+        num_angles = 0
+        num_candela = 0
+        catalog = {}
+        def intern(angles):
+            nonlocal num_angles
+            key = angles.tobytes()
+            offset = angle_offsets.get(key)
+            if offset is None:
+                offset = angle_offsets[key] = num_angles
+                angle_chunks.append(angles)
+                num_angles += angles.size
+            return [offset, angles.size]
+        for filename, data in profiles:
+            candela = data.candela_array
+            catalog[filename] = {
+                'keywords':{k: v.value for k, v in data.keywords.items()},
+                'fields':{k: v.value for k, v in data.fields.items()},
+                'vertical':intern(data.vertical_angles),
+                'horizontal':intern(data.horizontal_angles),
+                'candela':[num_candela, candela.size],
+            }
+            num_candela += candela.size
+        header = json.dumps(catalog).encode('utf-8')
+        h_block = create_block('%s.h' % (self.name), 8 + len(header))
+        self.blocks['h'] = h_block
+        np.frombuffer(h_block.buf, dtype=np.uint64, count=1)[0] = len(header)
+        h_block.buf[8:8 + len(header)] = header
+        self.blocks['a'] = create_block('%s.a' % (self.name), num_angles * 8)
+        self.blocks['c'] = create_block('%s.c' % (self.name), num_candela * 4)
+        self.catalog = catalog
+        angles = np.frombuffer(self.blocks['a'].buf, dtype=np.float64, count=num_angles)
+        if angle_chunks:
+            angles[:] = np.concatenate(angle_chunks)
+        candela = np.frombuffer(self.blocks['c'].buf, dtype=np.float32, count=num_candela)
+        for filename, data in profiles:
+            offset, size = catalog[filename]['candela']
+            candela[offset:offset + size] = data.candela_array.ravel()
+        self._map_arrays()
+    def _map_arrays(self):
+        a = self.blocks['a']
+        c = self.blocks['c']
+        # np.frombuffer holds a buffer export on the block, so closing it
+        # fails with BufferError while any view (or IESData) is still alive
+        self._angles = np.frombuffer(a.buf, dtype=np.float64, count=a.size // 8)
+        self._candela = np.frombuffer(c.buf, dtype=np.float32, count=c.size // 4)
+        self._angles.flags.writeable = False
+        self._candela.flags.writeable = False
+    def keys(self):
+        return sorted(self.catalog.keys())
+    def __contains__(self, filename):
+        return filename in self.catalog
+    def __len__(self):
+        return len(self.catalog)
+    def get(self, filename):
+        entry = self.catalog[filename]
+        v_offset, num_v = entry['vertical']
+        h_offset, num_h = entry['horizontal']
+        c_offset, size = entry['candela']
+        return IESData(
+            filename=filename,
+            keywords=entry['keywords'],
+            fields=entry['fields'],
+            angles={
+                'vertical':self._angles[v_offset:v_offset + num_v],
+                'horizontal':self._angles[h_offset:h_offset + num_h],
+            },
+            candela_array=self._candela[c_offset:c_offset + size].reshape(num_v, num_h),
+        )
+    def close(self):
+        # Raises BufferError, leaving the store open, while arrays handed
+        # out by get() are still alive: np.frombuffer holds a buffer export
+        # on the blocks, so they can't be unmapped under them
+        self._angles = None
+        self._candela = None
+        # IESData objects are in reference cycles (their keywords and fields
+        # point back to them), so dropped ones may not be freed yet
+        gc.collect()
+        closed = []
+        for key in ['a', 'c', 'h']:
+            try:
+                self.blocks[key].close()
+            except BufferError:
+                self._reopen(closed, key)
+                raise BufferError(
+                    'Shared profile store %s is still in use; release the '
+                    'profiles returned by get() before closing it' % (self.name))
+            closed.append(key)
+        if self.owner:
+            for block in self.blocks.values():
+                try:
+                    block.unlink()
+                except FileNotFoundError:
+                    # Already removed (e.g. by another process's tracker)
+                    if os.name == 'posix':
+                        resource_tracker.unregister(block._name, 'shared_memory')
+        self.blocks = {}
+    def _reopen(self, closed, failed):
+        # SharedMemory.close() releases its memoryview before the mmap
+        # refuses to close, so the failed block gets a new one
+        block = self.blocks[failed]
+        block._buf = memoryview(block._mmap)
+        for key in closed:
+            self.blocks[key] = attach_block(self.blocks[key].name)
+        self._map_arrays()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
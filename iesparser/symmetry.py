@@ -0,0 +1,67 @@
+import numpy as np
+
+# Horizontal symmetry classes of Type C photometry (LM-63)
+ROTATIONAL = 'rotational'   # a single horizontal angle
+QUADRANT = 'quadrant'       # 0 to 90
+BILATERAL = 'bilateral'     # 0 to 180, symmetric about the 0-180 plane
+BILATERAL_90 = 'bilateral_90'   # 90 to 270, symmetric about the 90-270 plane
+NONE = 'none'               # 0 to 360 (or less, without any symmetry)
+
+def detect_symmetry(h_angles):
+    h_angles = np.asarray(h_angles, dtype=float)
+    if h_angles.size < 2:
+        return ROTATIONAL
+    first, last = h_angles[0], h_angles[-1]
+    if first == 0. and last == 90.:
+        return QUADRANT
+    if first == 0. and last == 180.:
+        return BILATERAL
+    if first == 90. and last == 270.:
+        return BILATERAL_90
+    return NONE
+
+def fold_horizontal(horizontal, symmetry):
+    # Map horizontal angles anywhere on the circle into the stored range
+    h = np.asarray(horizontal, dtype=float) % 360.
+    if symmetry == ROTATIONAL:
+        return np.zeros(h.shape)
+    if symmetry in [QUADRANT, BILATERAL]:
+        h = np.where(h > 180., 360. - h, h)
+        if symmetry == QUADRANT:
+            h = np.where(h > 90., 180. - h, h)
+    elif symmetry == BILATERAL_90:
+        h = np.where(h < 90., 180. - h, h)
+        h = np.where(h > 270., 540. - h, h)
+    return h
+
+def expand_horizontal(h_angles, symmetry=None):
+    # Returns the full 0-360 horizontal angles implied by the stored ones and
+    # the index of the stored column for each of them. candela[:, index]
+    # is the expanded grid, but the index alone is usually all that's needed.
+    h_angles = np.asarray(h_angles, dtype=float)
+    if symmetry is None:
+        symmetry = detect_symmetry(h_angles)
+    if symmetry == ROTATIONAL:
+        full = np.array([0., 360.])
+    elif symmetry == QUADRANT:
+        full = np.concatenate([
+            h_angles, 180. - h_angles, 180. + h_angles, 360. - h_angles])
+    elif symmetry == BILATERAL:
+        full = np.concatenate([h_angles, 360. - h_angles])
+    elif symmetry == BILATERAL_90:
+        full = np.concatenate([h_angles, 180. - h_angles, 540. - h_angles])
+    else:
+        full = np.concatenate([h_angles, h_angles[:1] + 360.])
+    full = np.unique(full[(full >= 0.) & (full <= 360.)])
+    if symmetry == NONE:
+        # Without symmetry the only addition is closing the circle at 360
+        folded = np.where(full > h_angles[-1], h_angles[0], full)
+    else:
+        folded = fold_horizontal(full, symmetry)
+    index = np.searchsorted(h_angles, folded)
+    index = np.clip(index, 0, h_angles.size - 1)
+    # Snap to the nearest stored angle to absorb rounding in the mirroring
+    lower = np.clip(index - 1, 0, h_angles.size - 1)
+    use_lower = np.abs(h_angles[lower] - folded) < np.abs(h_angles[index] - folded)
+    index = np.where(use_lower, lower, index)
+    return full, index
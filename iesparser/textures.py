@@ -0,0 +1,112 @@
+import os
+import hashlib
+
+import numpy as np
+
+from . import IESData, symmetry
+from .cache import hash_file
+
+DEFAULT_RESOLUTION = 256
+MAX_SAMPLERS = 32
+
+_samplers = {}
+
+def get_lut_angles(resolution, rotational):
+    # Rows run from 0 (nadir) to 180 degrees inclusive. Columns start at 0
+    # and stop one step short of 360 so the map wraps horizontally.
+    if rotational:
+        v_size = resolution
+        h_size = 1
+    else:
+        v_size = resolution // 2
+        h_size = resolution
+    vertical = np.linspace(0., 180., v_size)
+    horizontal = np.arange(h_size) * (360. / h_size)
+    return np.meshgrid(vertical, horizontal, indexing='ij')
+
+def get_sampler(data, resolution, rotational, mode):
+    # Profiles sharing an angle grid share the precomputed sampler
+    key = (
+        data.vertical_angles.tobytes(),
+        data.horizontal_angles.tobytes(),
+        resolution, rotational, mode,
+    )
+    sampler = _samplers.get(key)
+    if sampler is None:
+        if len(_samplers) >= MAX_SAMPLERS:
+            _samplers.clear()
+        vertical, horizontal = get_lut_angles(resolution, rotational)
+        sampler = data.get_sampler(vertical, horizontal, mode)
+        _samplers[key] = sampler
+    return sampler
+
+def bake_lut(data, resolution=DEFAULT_RESOLUTION, **kwargs):
+    # Returns a float32 (resolution,) vertical profile for rotationally
+    # symmetric data, otherwise a (resolution // 2, resolution)
+    # equirectangular map
+    mode = kwargs.get('mode', 'bilinear')
+    normalize = kwargs.get('normalize', False)
+    rotational = kwargs.get('rotational')
+    if rotational is None:
+        rotational = data.symmetry == symmetry.ROTATIONAL
+    # Make sure the angle vectors exist in object mode
+    data.candela_array
+    sampler = get_sampler(data, resolution, rotational, mode)
+    lut = data.interpolate(None, sampler=sampler)
+    if normalize:
+        peak = lut.max()
+        if peak > 0:
+            lut = lut / peak
+    lut = lut.astype(np.float32)
+    if rotational:
+        lut = lut[:, 0]
+    return lut
+
+def write_lut(filename, lut):
+    # .npy keeps the shape; anything else is written as raw float32
+    lut = np.asarray(lut, dtype=np.float32)
+    if os.path.splitext(filename)[1].lower() == '.npy':
+        np.save(filename, lut)
+    else:
+        lut.tofile(filename)
+
+def export_lut(ies_filename, filename, resolution=DEFAULT_RESOLUTION, **kwargs):
+    data = IESData.from_file(ies_filename, dense=True)
+    lut = bake_lut(data, resolution, **kwargs)
+    write_lut(filename, lut)
+    return lut
+
+class LUTCache(object):
+    # Baked lookup tables on disk, keyed by the content hash of the IES
+    # file and the bake parameters
+    def __init__(self, **kwargs):
+        path = kwargs.get('path', '~/.cache/iesparser/lut')
+        self.path = os.path.expanduser(path)
+        self.ies_cache = kwargs.get('ies_cache')
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+    def get_key(self, file_hash, resolution, **kwargs):
+        params = '%s:%d:%s:%s:%s' % (
+            file_hash, resolution,
+            kwargs.get('mode', 'bilinear'),
+            kwargs.get('normalize', False),
+            kwargs.get('rotational'),
+        )
+        return hashlib.sha1(params.encode('utf-8')).hexdigest()
+    def get_lut(self, ies_filename, resolution=DEFAULT_RESOLUTION, **kwargs):
+        file_hash = hash_file(ies_filename)
+        key = self.get_key(file_hash, resolution, **kwargs)
+        lut_fn = os.path.join(self.path, key + '.npy')
+        if os.path.exists(lut_fn):
+            return np.load(lut_fn)
+        data = IESData.from_file(ies_filename, dense=True, cache=self.ies_cache)
+        lut = bake_lut(data, resolution, **kwargs)
+        tmp_fn = lut_fn + '.tmp'
+        with open(tmp_fn, 'wb') as f:
+            np.save(f, lut)
+        os.replace(tmp_fn, lut_fn)
+        return lut
+    def clear(self):
+        for fn in os.listdir(self.path):
+            if os.path.splitext(fn)[1] in ['.npy', '.tmp']:
+                os.remove(os.path.join(self.path, fn))
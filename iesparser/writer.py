@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+
+from . import IESData, IESField
+from .batch import map_files
+
+VALUES_PER_LINE = 10
+VALUE_FORMAT = '%.6g'
+
+DEFAULT_FIELDS = {
+    'num_lamps':1,
+    'lumens_per_lamp':-1.,
+    'candela_multiplier':1.,
+    'photometric_type':1,
+    'units_type':2,
+    'width':0.,
+    'length':0.,
+    'height':0.,
+    'ballast_factor':1.,
+    '_future_use':1.,
+    'input_watts':0.,
+}
+
+def format_field(value):
+    # The parser tells ints from floats by the presence of a '.'
+    if isinstance(value, float) or isinstance(value, np.floating):
+        s = repr(float(value))
+        if 'e' in s and '.' not in s:
+            s = s.replace('e', '.0e')
+        return s
+    return '%d' % (value)
+
+def iter_value_lines(values, values_per_line=VALUES_PER_LINE, fmt=VALUE_FORMAT):
+    # Formats a 1D array as text, one string per block of full lines plus
+    # one for the remainder
+    values = np.asarray(values, dtype=float).ravel()
+    num_full = values.size // values_per_line * values_per_line
+    if num_full:
+        line_fmt = ' '.join([fmt] * values_per_line) + '\n'
+        rows = values[:num_full].reshape(-1, values_per_line).tolist()
+        yield ''.join([line_fmt % tuple(row) for row in rows])
+    if num_full < values.size:
+        rest = values[num_full:].tolist()
+        yield ' '.join([fmt] * len(rest)) % tuple(rest) + '\n'
+
+def write_arrays(f, vertical_angles, horizontal_angles, candela, **kwargs):
+    # candela has shape (n_vertical, n_horizontal); it is written one
+    # horizontal angle at a time, so no full text copy is ever built
+    keywords = kwargs.get('keywords') or {}
+    values_per_line = kwargs.get('values_per_line', VALUES_PER_LINE)
+    fmt = kwargs.get('fmt', VALUE_FORMAT)
+    vertical_angles = np.asarray(vertical_angles, dtype=float)
+    horizontal_angles = np.asarray(horizontal_angles, dtype=float)
+    candela = np.asarray(candela).reshape(vertical_angles.size, horizontal_angles.size)
+    fields = dict(DEFAULT_FIELDS)
+    fields.update(kwargs.get('fields') or {})
+    fields['num_vertical_angles'] = vertical_angles.size
+    fields['num_horizontal_angles'] = horizontal_angles.size
+    lines = ['IESNA:LM-63-2002']
+    names = sorted(keywords.keys(), key=lambda k: k != 'TEST')
+    for name in names:
+        value = keywords[name]
+        if value and not value.startswith(' '):
+            value = ' ' + value
+        lines.append('[%s]%s' % (name, value))
+    lines.append('TILT=NONE')
+    for field_names in IESField._field_map:
+        lines.append(' '.join([format_field(fields[k]) for k in field_names]))
+    f.write('\n'.join(lines) + '\n')
+    for s in iter_value_lines(vertical_angles, values_per_line, fmt):
+        f.write(s)
+    for s in iter_value_lines(horizontal_angles, values_per_line, fmt):
+        f.write(s)
+    for j in range(horizontal_angles.size):
+        for s in iter_value_lines(candela[:, j], values_per_line, fmt):
+            f.write(s)
+
+def write_ies(f, data, **kwargs):
+    # f may be a filename or an open text file
+    if not hasattr(f, 'write'):
+        with open(os.path.expanduser(f), 'w') as _f:
+            return write_ies(_f, data, **kwargs)
+    candela = data.candela_array
+    kwargs.setdefault('keywords', {k: v.value for k, v in data.keywords.items()})
+    kwargs.setdefault('fields', {k: v.value for k, v in data.fields.items()})
+    write_arrays(f, data.vertical_angles, data.horizontal_angles, candela, **kwargs)
+
+def resample(data, vertical_step=None, horizontal_step=None, mode='bilinear'):
+    # Resamples onto a regular grid over the stored angle ranges, which
+    # keeps the symmetry of the original data
+    candela = data.candela_array
+    v_angles = data.vertical_angles
+    h_angles = data.horizontal_angles
+    if vertical_step is not None:
+        v_angles = np.arange(v_angles[0], v_angles[-1] + vertical_step * .5, vertical_step)
+    if horizontal_step is not None and h_angles.size > 1:
+        h_angles = np.arange(h_angles[0], h_angles[-1] + horizontal_step * .5, horizontal_step)
+    v, h = np.meshgrid(v_angles, h_angles, indexing='ij')
+    candela = data.interpolate(v, h, mode=mode, computed=False)
+    fields = {k: obj.value for k, obj in data.fields.items()}
+    fields.update(
+        num_vertical_angles=v_angles.size,
+        num_horizontal_angles=h_angles.size,
+    )
+    return IESData(
+        filename=data.filename,
+        keywords={k: obj.value for k, obj in data.keywords.items()},
+        fields=fields,
+        angles={'vertical':v_angles, 'horizontal':h_angles},
+        candela_array=candela,
+    )
+
+def resample_file(filename, out_filename, vertical_step, horizontal_step, mode='bilinear'):
+    # Runs in worker processes
+    try:
+        data = IESData.from_file(filename, dense=True)
+        data = resample(data, vertical_step, horizontal_step, mode)
+        write_ies(out_filename, data)
+    except Exception as e:
+        return filename, '%s: %s' % (e.__class__.__name__, e)
+    return filename, None
+
+def _resample_file_pair(filenames, *args):
+    return resample_file(filenames[0], filenames[1], *args)
+
+def resample_files(filenames, out_path, **kwargs):
+    # Writes each file to out_path under its path relative to root (by
+    # default the deepest directory containing all of them), so files with
+    # the same name in different directories don't overwrite each other.
+    # Returns a {filename: error} dict for the files that failed.
+    filenames = list(filenames)
+    if not filenames:
+        return {}
+    abs_filenames = [os.path.abspath(fn) for fn in filenames]
+    root = kwargs.get('root')
+    if root is None:
+        root = os.path.commonpath([os.path.dirname(fn) for fn in abs_filenames])
+    out_filenames = [
+        os.path.join(out_path, os.path.relpath(fn, os.path.abspath(root)))
+        for fn in abs_filenames]
+    for dirname in set(os.path.dirname(fn) for fn in out_filenames):
+        os.makedirs(dirname, exist_ok=True)
+    args = [
+        kwargs.get('vertical_step'),
+        kwargs.get('horizontal_step'),
+        kwargs.get('mode', 'bilinear'),
+    ]
+    results = map_files(
+        _resample_file_pair, list(zip(filenames, out_filenames)),
+        args=args,
+        max_workers=kwargs.get('max_workers'),
+    )
+    return {fn: error for fn, error in results if error is not None}